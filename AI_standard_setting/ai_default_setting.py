@@ -2,6 +2,13 @@ import numpy as np
 from game_setup.chess_rule import GamePosition, Move
 
 DEPTH = 1
+TT_SIZE_MB = 64 #memory budget of the transposition table
+TT_REPLACEMENT = 'depth' #'depth' or 'always'
+TIME_LIMIT = None #seconds per move for the iterative deepening search, None for no limit
+NODE_LIMIT = None #nodes per move, None for no limit
+QUIESCENCE = True #extend the leaves by captures, promotions and check evasions
+DELTA_MARGIN = 2 #captures that cannot bring the score within this margin of alpha are skipped
+DEBUG_EVAL = False #compare the incremental scores with a full scan of the board on every evaluation
 
 Piece_to_Value = {'wK': 0, 'wP': 1, 'wN': 3, 'wB': 3, 'wR': 5, 'wQ': 9,
                   'bK': 0, 'bP': -1, 'bN': -3, 'bB': -3, 'bR': -5, 'bQ': -9, '--' : 0}
@@ -46,6 +53,14 @@ Piece_to_positional_value = {'wN': Knight_positional_value, 'bN': Knight_positio
 WIN = 1000
 DRAW = 0
 
+#positional values with the sign of the piece's color
+Piece_to_signed_positional_value = {piece: ((1 if piece[0] == 'w' else -1) * np.asarray(table)).astype(int).tolist()
+                                    for piece, table in Piece_to_positional_value.items()}
+
+#called by the engines: the game positions created afterwards keep the totals of these tables up to date while moving
+def install_score_tables():
+    GamePosition.set_score_tables(Piece_to_Value, Piece_to_signed_positional_value)
+
 def expand_promotions_of_moves(legal_moves, position):
     promotion_pieces = ['Q', 'R', 'B', 'N']
     for i in range(len(legal_moves) - 1, -1, -1):
@@ -59,21 +74,51 @@ def expand_promotions_of_moves(legal_moves, position):
             for piece in promotion_pieces:
                 legal_moves.insert(i,Move((start_row, start_col), (end_row, end_col), position, promotion_piece = ally_color + piece))
 
+#material of the game position, updated incrementally by make_move/undo_move
+def get_material_score(gp):
+    if gp.score_log is None:
+        return cal_material_score(gp.position) #the game started before the tables were installed
+    if DEBUG_EVAL:
+        assert gp.material_score == cal_material_score(gp.position), 'incremental material score is out of sync'
+    return gp.material_score
+
 def cal_material_score(position):
-    r_num = len(position)
-    c_num = len(position[1])
-    values = np.empty((r_num, c_num))
-    for r in range(r_num):
-        for c in range(c_num):
-            values[r, c] = Piece_to_Value[position[r][c]]
-    return np.sum(values)
+    value = 0
+    for row in position:
+        for sq in row:
+            value += Piece_to_Value[sq]
+    return value
+
+#material and signed positional scores of a position, the totals kept by the game positions while moving
+def cal_scores(position):
+    material_score = 0
+    positional_score = 0
+    for r in range(8):
+        for c in range(8):
+            sq = position[r][c]
+            if sq != '--':
+                material_score += Piece_to_Value[sq]
+                positional_score += Piece_to_signed_positional_value[sq][r][c]
+    return material_score, positional_score
 
 def evaluate_position(gp, legal_moves):
     if gp.checkmate:
         return -WIN if gp.white_turn else WIN
     elif gp.stalemate:
         return -DRAW if gp.white_turn else -DRAW
-    
+
+    if gp.score_log is None:
+        material_score, positional_score = cal_scores(gp.position) #the game started before the tables were installed
+    else:
+        material_score, positional_score = gp.material_score, gp.positional_score
+    value = material_score + positional_score * .1
+    if DEBUG_EVAL:
+        full_value = evaluate_position_full_scan(gp)
+        assert abs(value - full_value) < 1e-9, 'incremental evaluation {} differs from the full scan {}'.format(value, full_value)
+    return value
+
+#the evaluation computed square by square, used to check the incremental scores
+def evaluate_position_full_scan(gp):
     r_num = len(gp.position)
     c_num = len(gp.position[1])   
     value= 0
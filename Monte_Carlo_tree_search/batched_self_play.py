@@ -0,0 +1,149 @@
+#self play of many games at once in one process, the leaves of all games are evaluated in one forward pass of the net
+import time
+import numpy as np
+from bitboard_rule_for_mcts import BitboardGamePosition
+from config import CONFIG
+from mcts import MonteCarloTreeSearch
+from self_play import get_game_result, get_winner_z
+
+#a game of the batched self play with its own search tree, searched step by step by BatchedSelfPlay
+class SelfPlayGame(object):
+    def __init__(self, mcts):
+        self.gp = BitboardGamePosition()
+        self.gp.get_legal_moves()
+        self.mcts = mcts
+        self.mcts.update_with_move(-1)
+        self.position_log, self.mcts_probs, self.cur_players = [], [], []
+        self.n_done = None    #playouts done for the current move, None until its search starts
+        self.forced = False
+
+    def is_searched(self):
+        #whether the search of the current move is over, a forced move is not searched
+        mcts = self.mcts
+        if self.n_done is None:
+            mcts.sync_with_game(self.gp)
+            self.n_done = 0
+            #the time limit of the move starts with its search
+            mcts._deadline = time.perf_counter() + mcts._time_limit if mcts._time_limit is not None else None
+            self.forced = len(self.gp.get_legal_moves(return_ids=True)) == 1 and mcts._early_stop
+        return self.forced or self.n_done >= mcts._n_playout or mcts._should_stop(self.n_done)
+
+    def select_leaves(self, n_leaves):
+        n_done, batch = self.mcts._select_batch(self.gp, min(n_leaves, self.mcts._n_playout - self.n_done))
+        self.n_done += n_done
+        return batch
+
+    def update_leaves(self, batch, results):
+        self.n_done += self.mcts._update_batch(batch, results)
+
+    def reset_search(self):
+        #forget the search tree, the search of the current move starts again from no playout
+        if self.n_done is not None:
+            self.mcts.n_playouts_done += self.n_done
+        self.mcts.update_with_move(-1)
+        self.mcts._deadline = None
+        self.n_done = None
+        self.forced = False
+
+    def play_move(self, temp):
+        #play the move chosen by the search, return whether the game ends and its winner
+        mcts = self.mcts
+        gp = self.gp
+        if self.forced:
+            acts, probs = tuple(gp.get_legal_moves(return_ids=True)), np.array([1.0])
+        else:
+            acts, probs = mcts.get_root_move_probs(temp)
+        mcts.n_playouts_done += self.n_done
+        mcts.n_playouts_saved += mcts._n_playout - self.n_done
+        move_probs = np.zeros(1968)
+        move_probs[list(acts)] = probs
+        #adding Diriclet noise for self playing
+        move = np.random.choice(
+            acts,
+            p=0.75*probs + 0.25*np.random.dirichlet(CONFIG['dirichlet'] * np.ones(len(probs)))
+        )
+        self.position_log.append(gp.get_array())
+        self.mcts_probs.append(move_probs)
+        self.cur_players.append(gp.white_turn)
+        gp.make_move_by_id(move)
+        gp.get_legal_moves()
+        mcts._deadline = None
+        self.n_done = None
+        return get_game_result(gp)
+
+    def get_play_data(self, winner_is_white):
+        return zip(self.position_log, self.mcts_probs, get_winner_z(self.cur_players, winner_is_white))
+
+#plays n_games self playing games at once, a finished game is replaced by a new one
+#at every step each game selects up to leaves_per_game leaves, and the leaves of all games go to one call of batch_policy_value_fn
+class BatchedSelfPlay(object):
+    def __init__(self, batch_policy_value_fn, n_games=None, c_puct=5, n_playout=2000, temp=1,
+                 leaves_per_game=None, eval_cache=None, tree_storage=None):
+        self._batch_policy = batch_policy_value_fn
+        self._temp = temp
+        self._leaves_per_game = CONFIG['eval_batch_size'] if leaves_per_game is None else leaves_per_game
+        n_games = CONFIG['self_play_games'] if n_games is None else n_games
+        #one search per game, kept for the next game played in its slot
+        self._games = [SelfPlayGame(MonteCarloTreeSearch(None, c_puct, n_playout, tree_storage,
+                                                         batch_policy_value_fn, eval_cache=eval_cache))
+                       for i in range(n_games)]
+        self.n_games_done = 0
+        self.n_moves_done = 0
+        self.n_batches = 0
+        self.n_evaluated = 0
+        self.eval_time = 0.0
+        self.start_time = time.time()
+
+    #forget the search trees, e.g. when the model changes
+    #the leaves are only pending during _search_step, so there are none to drop between two steps
+    def reset_trees(self):
+        for game in self._games:
+            game.reset_search()
+
+    def get_stats(self):
+        elapsed = max(time.time() - self.start_time, 1e-9)
+        return {'games': self.n_games_done, 'moves': self.n_moves_done, 'moves_per_s': self.n_moves_done / elapsed,
+                'batches': self.n_batches, 'mean_batch': self.n_evaluated / max(1, self.n_batches),
+                'evals_per_s': self.n_evaluated / elapsed, 'eval_time_share': self.eval_time / elapsed}
+
+    def _play_searched_moves(self):
+        #play the moves of the games whose search is over, return the finished games (winner_is_white, play_data)
+        finished = []
+        for i, game in enumerate(self._games):
+            while game.is_searched():
+                end, winner_is_white = game.play_move(self._temp)
+                self.n_moves_done += 1
+                if end:
+                    finished.append((winner_is_white, game.get_play_data(winner_is_white)))
+                    self.n_games_done += 1
+                    game = SelfPlayGame(game.mcts)
+                    self._games[i] = game
+        return finished
+
+    def _search_step(self):
+        #select the leaves of every game, evaluate them together and update the trees
+        batches = [game.select_leaves(self._leaves_per_game) for game in self._games]
+        position_batch, legal_moves_batch = [], []
+        for leaves, keys, positions, legal_moves in batches:
+            position_batch += positions
+            legal_moves_batch += legal_moves
+        if len(position_batch) == 0:
+            return
+        start_time = time.time()
+        results = self._batch_policy(position_batch, legal_moves_batch)
+        self.eval_time += time.time() - start_time
+        self.n_batches += 1
+        self.n_evaluated += len(position_batch)
+        start = 0
+        for game, batch in zip(self._games, batches):
+            n_leaves = len(batch[0])
+            if n_leaves > 0:
+                game.update_leaves(batch, results[start:start + n_leaves])
+                start += n_leaves
+
+    def play(self):
+        #generator of the finished games as (winner_is_white, play_data), the same as MCT_start_self_play
+        while True:
+            for result in self._play_searched_moves():
+                yield result
+            self._search_step()
@@ -1,70 +1,117 @@
 #collect self playing data
 import os
 import random
-from collections import deque
 import copy
-import pickle
 import time
-import chess_rule_for_mcts as chess_rule
+from bitboard_rule_for_mcts import BitboardGamePosition
 from mcts import MCTSPlayer
+from root_parallel import RootParallelMCTSPlayer
+from batched_self_play import BatchedSelfPlay
 from config import CONFIG
 from net import PolicyValueNet
+from inference_server import InferenceClient
 from self_play import MCT_start_self_play
+from replay_buffer import ReplayBuffer
+from compact_samples import encode_game
 
 #define the whole process of playing deta collecting
 class CollectPipeline:
     def __init__(self, init_model=None):
-        self.gp = chess_rule.GamePosition()
+        self.gp = BitboardGamePosition()
         #playing params
         self.temp = 1  #tempreture
         self.n_playout = CONFIG['play_out']  #stimulate times per move
         self.c_puct = CONFIG['c_puct']  #weight of u
         self.buffer_size = CONFIG['buffer_size'] 
-        self.data_buffer = deque(maxlen=self.buffer_size)
+        self.replay_buffer = None    #opened by the first game saved
         self.iters = 0
+        self.policy_value_net = None
+        self.mcts_player = None
+        self.batched_self_play = None
+        self.finished_games = None
+        self.model_mtime = None
    
     #load the model
     def load_model(self):
         model_path = CONFIG['pytorch_model_path']
-        try:
-            self.policy_value_net = PolicyValueNet(model_file=model_path)
-            print('Loaded the newest model')
-        except:
-            self.policy_value_net = PolicyValueNet()
-            print('Loaded the initial model')
+        #only reload when the checkpoint changed, so the cached evaluations are kept between games
+        model_mtime = os.path.getmtime(model_path) if os.path.exists(model_path) else None
+        if (self.mcts_player is not None or self.batched_self_play is not None) and model_mtime == self.model_mtime:
+            return
+        self.model_mtime = model_mtime
+        if CONFIG['root_parallel_workers'] > 1:
+            #the worker processes load the model themselves and are kept between games
+            if self.mcts_player is None:
+                self.mcts_player = RootParallelMCTSPlayer(model_path,
+                                                          c_puct=self.c_puct,
+                                                          n_playout=self.n_playout,
+                                                          is_selfplay=1)
+            else:
+                self.mcts_player.load_model(model_path)
+            return
+        if self.batched_self_play is not None:
+            #the games going on are kept, only their trees are searched again with the new model
+            try:
+                self.policy_value_net.load_model(model_path)
+                print('Loaded the newest model')
+            except:
+                pass
+            self.batched_self_play.reset_trees()
+            return
+        if CONFIG['use_inference_server']:
+            #the model is held by the inference server, which loads each checkpoint once for all the processes
+            if self.policy_value_net is None:
+                self.policy_value_net = InferenceClient()
+            try:
+                self.policy_value_net.load_model(model_path)
+                print('Loaded the newest model')
+            except:
+                print('The inference server keeps its model')
+        else:
+            try:
+                self.policy_value_net = PolicyValueNet(model_file=model_path)
+                print('Loaded the newest model')
+            except:
+                self.policy_value_net = PolicyValueNet()
+                print('Loaded the initial model')
+        if CONFIG['self_play_games'] > 1:
+            #many games are played at once, their leaves are evaluated in one forward pass
+            self.batched_self_play = BatchedSelfPlay(self.policy_value_net.policy_value_fn_batch,
+                                                     c_puct=self.c_puct,
+                                                     n_playout=self.n_playout,
+                                                     temp=self.temp,
+                                                     eval_cache=self.policy_value_net.eval_cache)
+            self.finished_games = self.batched_self_play.play()
+            return
         self.mcts_player = MCTSPlayer(self.policy_value_net.policy_value_fn,
                                       c_puct=self.c_puct,
                                       n_playout=self.n_playout,
-                                      is_selfplay=1)
+                                      is_selfplay=1,
+                                      batch_policy_value_function=self.policy_value_net.policy_value_fn_batch,
+                                      eval_cache=self.policy_value_net.eval_cache)
         
+    #play a self playing game with the newest model, return its data encoded by encode_game
+    def play_game(self):
+        self.load_model()  #load the newest model
+        if self.batched_self_play is not None:
+            winner_is_white, play_data = next(self.finished_games)
+        else:
+            winner_is_white, play_data = MCT_start_self_play(self.mcts_player, temp=self.temp, is_shown=False)
+        return encode_game(play_data)
+
+    #append the data of a game to the replay buffer, only the new samples are written
+    def save_play_data(self, play_data):
+        if self.replay_buffer is None:
+            self.replay_buffer = ReplayBuffer(buffer_size=self.buffer_size, writer=True)
+        self.replay_buffer.add_game(play_data)
+        self.iters = self.replay_buffer.iters
+
     def collect_selfplay_data(self, n_games=1):
         #collect data generated by self playing
         for i in range(n_games):
-            self.load_model()  #load the newest model
-            winner_is_white, play_data = MCT_start_self_play(self.mcts_player, temp=self.temp, is_shown=False)
-            play_data = list(play_data)[:]
-            self.episode_len = len(play_data)
-            if os.path.exists(CONFIG['train_data_buffer_path']):
-                while True:
-                    try:
-                        with open(CONFIG['train_data_buffer_path'], 'rb') as data_dict:
-                            data_file = pickle.load(data_dict)
-                            self.data_buffer = deque(maxlen=self.buffer_size)
-                            self.data_buffer.extend(data_file['data_buffer'])
-                            self.iters = data_file['iters']
-                            del data_file
-                            self.iters += 1
-                            self.data_buffer.extend(play_data)
-                        print('Successfully loaded data.')
-                        break
-                    except:
-                        time.sleep(30)
-            else:
-                self.data_buffer.extend(play_data)
-                self.iters += 1
-            data_dict = {'data_buffer': self.data_buffer, 'iters': self.iters}
-            with open(CONFIG['train_data_buffer_path'], 'wb') as data_file:
-                pickle.dump(data_dict, data_file)
+            play_data = self.play_game()
+            self.episode_len = len(play_data['winners'])
+            self.save_play_data(play_data)
         return self.iters
     
     def run(self):
@@ -77,5 +124,6 @@ class CollectPipeline:
         except KeyboardInterrupt:
             print('\n\rquit')
 
-collecting_pipeline = CollectPipeline(init_model='current_policy.pkl')
-collecting_pipeline.run()
+if __name__ == '__main__':    #the root parallel workers import this module again
+    collecting_pipeline = CollectPipeline(init_model='current_policy.pkl')
+    collecting_pipeline.run()
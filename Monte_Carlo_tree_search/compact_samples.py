@@ -0,0 +1,49 @@
+#compact encoding of the training samples, used in the replay buffer and between the self playing processes
+#the planes of a position only hold -1, 0 and 1, they are stored as two packed bit masks
+#the move probs are stored as (move id, float16 prob) pairs of the visited moves, the winner as int8
+#the samples are decoded into dense float32 arrays by batches, when they are drawn for training
+import numpy as np
+
+#most legal moves of any chess position, so the visited moves of a sample always fit
+MAX_POLICY_MOVES = 218
+#move id of the unused pairs, one more than the last move id
+PAD_MOVE_ID = 1968
+POSITION_SHAPE = (9, 8, 8)
+POSITION_BYTES = 2 * 9 * 8 * 8 // 8
+
+def encode_positions(position_batch):
+    positions = np.asarray(position_batch).reshape(-1, 9 * 8 * 8)
+    return np.concatenate([np.packbits(positions > 0, axis=1), np.packbits(positions < 0, axis=1)], axis=1)
+
+def decode_positions(position_bits):
+    half = POSITION_BYTES // 2
+    positive = np.unpackbits(position_bits[:, :half], axis=1).astype(np.float32)
+    negative = np.unpackbits(position_bits[:, half:], axis=1).astype(np.float32)
+    return (positive - negative).reshape((-1,) + POSITION_SHAPE)
+
+def encode_probs(probs_batch):
+    #keep the moves whose prob is not 0 in float16, the unused pairs get PAD_MOVE_ID and prob 0
+    probs = np.asarray(probs_batch, dtype=np.float16).reshape(-1, 1968)
+    move_ids = np.argsort(-probs, axis=1, kind='stable')[:, :MAX_POLICY_MOVES]
+    move_probs = np.take_along_axis(probs, move_ids, axis=1)
+    move_ids = np.where(move_probs > 0, move_ids, PAD_MOVE_ID).astype(np.int16)
+    return move_ids, move_probs
+
+def decode_probs(move_ids, move_probs):
+    #the pads are written to an extra column which is dropped, the probs are normalized again after the float16 rounding
+    probs = np.zeros((len(move_ids), PAD_MOVE_ID + 1), dtype=np.float32)
+    np.put_along_axis(probs, move_ids.astype(np.int64), move_probs.astype(np.float32), axis=1)
+    probs = probs[:, :PAD_MOVE_ID]
+    return probs / np.maximum(probs.sum(axis=1, keepdims=True), 1e-10)
+
+#encode the samples (position array, move probs, winner) of a game, return a dict of arrays with one row per sample
+def encode_game(play_data):
+    positions, probs, winners = zip(*play_data)
+    move_ids, move_probs = encode_probs(probs)
+    return {'position_bits': encode_positions(positions), 'move_ids': move_ids, 'move_probs': move_probs,
+            'winners': np.array(winners).astype(np.int8)}
+
+#decode rows of encode_game arrays into the positions, move probs and winners as float32 arrays
+def decode_samples(samples):
+    return (decode_positions(samples['position_bits']), decode_probs(samples['move_ids'], samples['move_probs']),
+            samples['winners'].astype(np.float32))
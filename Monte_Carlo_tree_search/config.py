@@ -2,10 +2,28 @@ CONFIG = {
     'dirichlet': 0.3, 
     'play_out': 1200,        # 每次移动的模拟次数
     'c_puct': 5,             # u的权重
+    'early_stop': False,     # 最多访问的走法已不可能被超过时提前停止模拟, 只有一种走法时不模拟
+    'move_time_limit': None, # 每步搜索的时间上限(秒), None表示不限
+    'max_tree_nodes': 200000,  # 搜索树的节点数上限, 超过时在两步之间剪掉访问次数少的子树, None表示不限
+    'eval_batch_size': 1,   # 每次用网络同时评估的叶节点数量, 1表示逐个评估
+    'virtual_loss': 1.0,     # 虚拟损失的权重, 使同一批次的搜索路径分散
+    'search_threads': 1,     # 共享同一棵搜索树的线程数, 大于1时各线程的叶节点由同一个评估器批量评估
+    'root_parallel_workers': 1,   # 根并行的进程数, 大于1时每个进程独立搜索, 合并根节点的访问次数
+    'root_parallel_noise': 0.25,  # 根并行时各进程根节点先验概率中狄利克雷噪声的权重
+    'self_play_games': 1,    # 同一进程中同时进行的自我对弈局数, 大于1时所有对局的叶节点一起批量评估
+    'self_play_workers': None,   # supervisor.py启动的自我对弈进程数, None表示使用所有CPU核
+    'use_inference_server': False,   # 自我对弈进程是否把局面发给推理服务(inference_server.py)评估, 而不各自加载模型
+    'inference_server_port': 6000,   # 推理服务在本机监听的端口
+    'inference_server_authkey': b'chess_inference',   # 推理服务连接的认证密钥
+    'inference_batch_size': 512,     # 推理服务每批最多评估的局面数
+    'inference_max_wait': 0.002,     # 推理服务凑批时最多等待的时间(秒)
+    'eval_cache_mb': 256,    # 网络评估缓存的内存上限(MB), 按局面哈希存储先验概率和评估值
+    'tree_storage': 'dict',   # 搜索树的存储方式: 'array' 子节点统计量存于numpy数组, 'dict' 每个子节点一个TreeNode, 'dag' 相同局面共享节点
     'buffer_size': 10000,   # 经验池大小
     'paddle_model_path': 'current_policy.model',      # paddle模型路径
     'pytorch_model_path': 'current_policy.pkl',   # pytorch模型路径
-    'train_data_buffer_path': 'train_data_buffer.pkl',   # 数据容器的路径
+    'replay_buffer_path': 'replay_buffer',   # 经验池的目录, 样本按分片存为.npy文件, 只追加写入, 训练时内存映射读取
+    'replay_shard_size': 2048,   # 经验池每个分片的样本数
     'batch_size': 512,  # 每次更新的train_step数量
     'kl_targ': 0.02,  # kl散度控制
     'epochs' : 5,  # 每次更新的train_step数量
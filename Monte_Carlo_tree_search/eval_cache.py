@@ -0,0 +1,77 @@
+#cache of the network evaluations, keyed by the position hash
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+
+#rough size of an entry without its arrays: the slot in the dict, the key and the stored tuple
+ENTRY_OVERHEAD_BYTES = 100 + sys.getsizeof((2 ** 63, (0, 0, 0, 0))) + sys.getsizeof((None, None, 0.0))
+
+#key of a position for the cache, the input planes of the net also show the last move so it is part of the key
+def get_eval_key(gp):
+    if len(gp.move_history) == 0:
+        return gp.zobrist_key, None
+    move = gp.move_history[-1]
+    return gp.zobrist_key, (move.start_row, move.start_col, move.end_row, move.end_col)
+
+# least recently used cache of (legal move priors, value), limited by its memory use
+# one cache can be shared by several MCTS of a process, it must be cleared when the model changes
+# generation counts the clears, so the searches sharing the cache know their trees are from an old model
+class EvalCache():
+    def __init__(self, max_mb=64):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.entries = OrderedDict()
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    # return (zip of (move id, prob), value) or None
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        move_ids, probs, value = entry
+        return zip(move_ids.tolist(), probs), value
+
+    # store the evaluation of a position, action_probs is an iterable of (move id, prob), return them as a list
+    def put(self, key, action_probs, value):
+        action_probs = list(action_probs)
+        move_ids = np.array([act for act, prob in action_probs], dtype=np.int16)
+        probs = np.array([prob for act, prob in action_probs], dtype=np.float16)
+        entry = (move_ids, probs, float(np.squeeze(value)))
+        entry_bytes = ENTRY_OVERHEAD_BYTES + move_ids.nbytes + probs.nbytes
+        with self.lock:
+            old_entry = self.entries.pop(key, None)
+            if old_entry is not None:
+                self.n_bytes -= ENTRY_OVERHEAD_BYTES + old_entry[0].nbytes + old_entry[1].nbytes
+            self.entries[key] = entry
+            self.n_bytes += entry_bytes
+            while self.n_bytes > self.max_bytes and len(self.entries) > 0:
+                old_key, old_entry = self.entries.popitem(last=False)
+                self.n_bytes -= ENTRY_OVERHEAD_BYTES + old_entry[0].nbytes + old_entry[1].nbytes
+        return action_probs
+
+    # forget every evaluation, e.g. when a new checkpoint is loaded
+    def clear(self):
+        with self.lock:
+            self.entries = OrderedDict()
+            self.n_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.generation += 1
+
+    def hit_rate(self):
+        return self.hits / (self.hits + self.misses) if self.hits + self.misses > 0 else 0.0
+
+    def get_stats(self):
+        return {'entries': len(self.entries), 'mb': self.n_bytes / (1024 * 1024), 'hits': self.hits,
+                'misses': self.misses, 'hit_rate': self.hit_rate()}
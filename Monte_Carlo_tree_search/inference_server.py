@@ -0,0 +1,211 @@
+#inference server: one process holds the model and evaluates the positions sent by the self playing processes
+#the requests of all clients are evaluated together, in batches of up to inference_batch_size positions
+#every evaluation is sent with the version of the model that made it, so a client knows when another one had a new checkpoint loaded
+import os
+import time
+import queue
+import threading
+import traceback
+from collections import deque
+from multiprocessing.connection import Listener, Client
+import numpy as np
+import torch
+from config import CONFIG
+from eval_cache import EvalCache
+from net import PolicyValueNet
+
+#seconds between two reports of the metrics of the server
+STATS_INTERVAL = 60
+
+def get_server_address():
+    return ('127.0.0.1', CONFIG['inference_server_port'])
+
+class InferenceServer(object):
+    def __init__(self, model_file=None, address=None, max_batch_size=None, max_wait=None):
+        self._address = get_server_address() if address is None else address
+        self._max_batch_size = CONFIG['inference_batch_size'] if max_batch_size is None else max_batch_size
+        self._max_wait = CONFIG['inference_max_wait'] if max_wait is None else max_wait    #seconds to wait for more positions before evaluating an incomplete batch
+        self._queue = queue.Queue()
+        self._model_mtime = None
+        self.model_version = 0    #incremented at every checkpoint loaded
+        try:
+            self.policy_value_net = PolicyValueNet(model_file=model_file)
+            self._model_mtime = os.path.getmtime(model_file)
+            print('Loaded the newest model')
+        except:
+            self.policy_value_net = PolicyValueNet()
+            print('Loaded the initial model')
+        #metrics
+        self.start_time = time.time()
+        self.n_requests = 0
+        self.n_evaluated = 0
+        self.n_batches = 0
+        self.eval_time = 0.0
+        self.latencies = deque(maxlen=10000)    #seconds waited in the queue by the last requests
+        self._last_report = time.time()
+
+    def get_stats(self):
+        elapsed = max(time.time() - self.start_time, 1e-9)
+        latencies = np.array(self.latencies) * 1000 if len(self.latencies) > 0 else np.zeros(1)
+        return {'requests': self.n_requests, 'positions': self.n_evaluated, 'batches': self.n_batches,
+                'mean_batch': self.n_evaluated / max(1, self.n_batches), 'evals_per_s': self.n_evaluated / elapsed,
+                'busy': self.eval_time / elapsed, 'queue_ms_mean': float(np.mean(latencies)),
+                'queue_ms_p95': float(np.percentile(latencies, 95)), 'queue_ms_max': float(np.max(latencies))}
+
+    def serve_forever(self):
+        batch_thread = threading.Thread(target=self._run_batches, daemon=True)
+        batch_thread.start()
+        with Listener(self._address, authkey=CONFIG['inference_server_authkey']) as listener:
+            print('Inference server listening on {}'.format(self._address))
+            while batch_thread.is_alive():
+                try:
+                    conn = listener.accept()
+                except Exception:
+                    continue    #a client failed to connect
+                threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+
+    def _submit(self, kind, arg):
+        #queue a request and block until the batch thread has done it
+        request = [kind, arg, time.time(), threading.Event(), None, None] #the last two are the result and the error
+        self._queue.put(request)
+        request[3].wait()
+        if request[5] is not None:
+            raise request[5]
+        return request[4]
+
+    def _serve_client(self, conn):
+        #commands: ('evaluate', (int8 position arrays, legal move ids)), ('load_model', model file), ('stats', None), ('close', None)
+        #evaluate answers (legal move probs, values, model version), load_model answers the model version
+        try:
+            while True:
+                try:
+                    command, arg = conn.recv()
+                except EOFError:
+                    return
+                try:
+                    if command == 'evaluate':
+                        conn.send(('ok', self._submit('evaluate', arg)))
+                    elif command == 'load_model':
+                        conn.send(('ok', self._submit('load_model', arg)))
+                    elif command == 'stats':
+                        conn.send(('ok', self.get_stats()))
+                    elif command == 'close':
+                        return
+                except Exception:
+                    conn.send(('error', traceback.format_exc()))
+        finally:
+            conn.close()
+
+    def _load_model(self, model_file):
+        #every client asks for the new checkpoint, it is only loaded once
+        model_mtime = os.path.getmtime(model_file)
+        if model_mtime != self._model_mtime:
+            self.policy_value_net.load_model(model_file)
+            self._model_mtime = model_mtime
+            self.model_version += 1
+            print('Loaded the newest model')
+        return self.model_version
+
+    def _run_batches(self):
+        while True:
+            request = self._queue.get()
+            if request[0] == 'load_model':
+                try:
+                    request[4] = self._load_model(request[1])
+                except Exception as error:
+                    request[5] = error
+                request[3].set()
+                continue
+            #gather the requests arriving before the batch is full or the first request has waited max_wait
+            batch = [request]
+            n_positions = len(request[1][1])
+            deadline = request[2] + self._max_wait
+            while n_positions < self._max_batch_size:
+                try:
+                    request = self._queue.get(timeout=max(0.0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                if request[0] != 'evaluate':
+                    self._queue.put(request)    #done after this batch
+                    break
+                batch.append(request)
+                n_positions += len(request[1][1])
+            self._evaluate(batch)
+
+    def _evaluate(self, batch):
+        start_time = time.time()
+        try:
+            positions = np.concatenate([request[1][0] for request in batch])
+            legal_moves_batch = [legal_moves for request in batch for legal_moves in request[1][1]]
+            legal_probs, values = self.policy_value_net.policy_value_arrays(positions, legal_moves_batch)
+            start = 0
+            for request in batch:
+                n = len(request[1][1])
+                request[4] = (legal_probs[start:start + n], values[start:start + n], self.model_version)
+                start += n
+        except Exception as error:
+            for request in batch:
+                request[5] = error
+        self.eval_time += time.time() - start_time
+        self.n_batches += 1
+        self.n_requests += len(batch)
+        self.n_evaluated += sum(len(request[1][1]) for request in batch)
+        self.latencies.extend(start_time - request[2] for request in batch)
+        for request in batch:
+            request[3].set()
+        if time.time() - self._last_report > STATS_INTERVAL:
+            self._last_report = time.time()
+            print('Inference: ' + ', '.join('{} {:.4g}'.format(key, value) for key, value in self.get_stats().items()))
+
+#client of the inference server, used in place of PolicyValueNet by the searches of a self playing process
+class InferenceClient(object):
+    def __init__(self, address=None):
+        self._conn = Client(get_server_address() if address is None else address, authkey=CONFIG['inference_server_authkey'])
+        self._lock = threading.Lock()
+        #evaluations of the positions met by the searches of this process
+        self.eval_cache = EvalCache(CONFIG['eval_cache_mb'])
+        self.model_version = None    #version of the model of the server, known from its last answer
+
+    def _call(self, command, arg):
+        with self._lock:
+            self._conn.send((command, arg))
+            status, result = self._conn.recv()
+        if status == 'error':
+            raise RuntimeError('inference server failed:\n' + result)
+        return result
+
+    def _set_model_version(self, model_version):
+        #the server has another model, the cached evaluations are dropped and so are the trees searched with them
+        #(MonteCarloTreeSearch drops its tree at the next move when the cache is cleared)
+        if self.model_version is not None and model_version != self.model_version:
+            self.eval_cache.clear()
+        self.model_version = model_version
+
+    #given a game position, return the legal moves and eval
+    def policy_value_fn(self, gp):
+        legal_moves_id_list = gp.get_legal_moves(return_ids=True)
+        return self.policy_value_fn_batch([gp.get_array()], [legal_moves_id_list])[0]
+
+    #the same as PolicyValueNet.policy_value_fn_batch, the planes are sent as int8 since they only hold -1, 0 and 1
+    def policy_value_fn_batch(self, position_batch, legal_moves_batch):
+        positions = np.array(position_batch, dtype=np.int8).reshape(-1, 9, 8, 8)
+        legal_probs, values, model_version = self._call('evaluate', (positions, legal_moves_batch))
+        self._set_model_version(model_version)
+        return [(zip(legal_moves_id_list, legal_probs[i]), values[i])
+                for i, legal_moves_id_list in enumerate(legal_moves_batch)]
+
+    #ask the server for a new checkpoint, the cached evaluations of the old model are dropped if it changed
+    def load_model(self, model_file):
+        self._set_model_version(self._call('load_model', model_file))
+
+    def get_stats(self):
+        return self._call('stats', None)
+
+    def close(self):
+        with self._lock:
+            self._conn.send(('close', None))
+            self._conn.close()
+
+if __name__ == '__main__':
+    torch.set_num_threads(os.cpu_count() or 1)
+    InferenceServer(CONFIG['pytorch_model_path']).serve_forever()
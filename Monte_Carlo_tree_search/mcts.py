@@ -1,6 +1,19 @@
 import numpy as np
 import copy
+import queue
+import threading
+import time
 from config import CONFIG
+from eval_cache import get_eval_key
+from chess_rule_for_mcts import move_to_id
+
+#playouts between two checks of the early stopping conditions
+STOP_CHECK_INTERVAL = 8
+#number of locks shared by the nodes of a tree searched by several threads, a node uses the lock of its id
+NODE_LOCK_STRIPES = 64
+
+def get_move_id(move):
+    return move_to_id[(move.start_row, move.start_col, move.end_row, move.end_col, move.promotion_piece[-1])]
 
 def softmax(x):
     probs = np.exp(x - np.max(x))
@@ -16,6 +29,7 @@ class TreeNode(object):
         self._Q = 0             #value of the move corresponding to the node
         self.u = 0             #confidence upper bound    (PUCT)
         self._P = prior_p
+        self._proven = None     #proven result of the move (1 win, 0 draw, -1 loss), None while unknown
 
     def expand(self, action_priors): #set the probs of illegal moves as 0
         #set new nodes
@@ -24,14 +38,33 @@ class TreeNode(object):
                 self._children[action] =  TreeNode(self, prob)
 
     def select(self, c_puct):
-        #select the node that provides the maximum of Q+U
-        return max(self._children.items(), key = lambda act_node: act_node[1].get_value(c_puct))
+        #select the node that provides the maximum of Q+U, the moves proven to lose are never selected
+        return max(self._children.items(), key = lambda act_node: act_node[1].get_value(c_puct) if act_node[1]._proven != -1 else -np.inf)
     
     def get_value(self, c_puct):
         #calculate and return the value of the node
         #c_puct: (0, inf)
         self._u = (c_puct * self._P *np.sqrt(self._parent._n_visits) / (1 + self._n_visits))
         return self._Q + self._u
+
+    def get_proven(self):
+        return self._proven
+
+    def set_proven(self, result):
+        self._proven = result
+
+    def update_proven(self):
+        #prove the node from its children: the player to move wins if one move wins, otherwise gets the best of the moves once all are proven
+        #return the result, or None if the node is not proven
+        results = [node._proven for node in self._children.values()]
+        if 1 in results:
+            self._proven = -1
+        elif len(results) > 0 and None not in results:
+            self._proven = -max(results)
+        return self._proven
+
+    def get_child_proven(self):
+        return [(act, node._proven) for act, node in self._children.items()]
     
     def update(self, leaf_value):
         #update backward
@@ -52,87 +85,1018 @@ class TreeNode(object):
     def is_root(self):
         return self._parent is None
 
+    def get_id(self):
+        return id(self)
+
+    def get_child(self, action):
+        return self._children.get(action)
+
+    def get_child_visits(self):
+        #moves of the children and their visiting times
+        return [(act, node._n_visits) for act, node in self._children.items()]
+
+    def make_root(self):
+        self._parent = None
+
+    def count_nodes(self):
+        n_nodes = 0
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            n_nodes += 1
+            stack.extend(node._children.values())
+        return n_nodes
+
+    def prune(self, min_visits):
+        #forget the subtrees below the nodes visited less than min_visits times, the nodes keep their own statistics
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            for child in node._children.values():
+                if child._n_visits < min_visits:
+                    child._children = {}
+                else:
+                    stack.append(child)
+
+    def add_dirichlet_noise(self, weight, alpha):
+        #mix dirichlet noise into the priors of the children
+        noise = np.random.dirichlet(alpha * np.ones(len(self._children)))
+        for node, eta in zip(self._children.values(), noise):
+            node._P = (1 - weight) * node._P + weight * eta
+
+    def add_virtual_loss(self, virtual_loss):
+        #count a pending visit as a loss, so that the other paths of a batch avoid this node
+        self._Q = (self._Q * self._n_visits - virtual_loss) / (self._n_visits + 1)
+        self._n_visits += 1
+
+    def revert_virtual_loss(self, virtual_loss):
+        self._n_visits -= 1
+        self._Q = (self._Q * (self._n_visits + 1) + virtual_loss) / self._n_visits if self._n_visits > 0 else 0
+
+#tree node keeping the statistics of its children in numpy arrays,
+#a child object is only created when it is visited for the first time
+class ArrayTreeNode(object):
+    def __init__(self, parent, index=-1):
+        self._parent = parent
+        self._index = index      #slot of the node in the arrays of its parent
+        self._n_visits = 0
+        self._actions = None     #moves of the children, None until the node is expanded
+        self._priors = None
+        self._child_visits = None
+        self._child_value_sums = None    #sum of the values backed up through each child
+        self._children = None    #child nodes, None for the children never visited
+        self._child_proven = None    #proven results of the children (1 win, 0 draw, -1 loss), nan while unknown
+        self._proven = None
+
+    def expand(self, action_priors):
+        action_priors = list(action_priors)
+        if len(action_priors) == 0:
+            return
+        actions, priors = zip(*action_priors)
+        self._actions = np.array(actions, dtype=np.int64)
+        self._priors = np.array(priors, dtype=np.float64)
+        self._child_visits = np.zeros(len(actions), dtype=np.float64)
+        self._child_value_sums = np.zeros(len(actions), dtype=np.float64)
+        self._children = [None] * len(actions)
+        self._child_proven = np.full(len(actions), np.nan)
+
+    def select(self, c_puct):
+        #select the child that provides the maximum of Q+U, computed for all children at once
+        #the moves proven to lose are never selected
+        q = self._child_value_sums / np.maximum(self._child_visits, 1)
+        u = c_puct * self._priors * np.sqrt(self._n_visits) / (1 + self._child_visits)
+        index = int(np.argmax(np.where(self._child_proven == -1, -np.inf, q + u)))
+        child = self._children[index]
+        if child is None:
+            #the child may have been pruned, it gets back the statistics kept in the arrays
+            child = ArrayTreeNode(self, index)
+            child._n_visits = int(self._child_visits[index])
+            if not np.isnan(self._child_proven[index]):
+                child._proven = int(self._child_proven[index])
+            self._children[index] = child
+        return int(self._actions[index]), child
+
+    def update(self, leaf_value):
+        self._n_visits += 1
+        if self._parent is not None:
+            self._parent._child_visits[self._index] += 1
+            self._parent._child_value_sums[self._index] += leaf_value
+
+    def update_recursive(self, leaf_value):
+        #update the node and all its ancestors, changing the perspective of player at each step
+        leaf_value = float(np.squeeze(leaf_value)) #the net returns the value as a 1x1 array
+        node = self
+        while node is not None:
+            node.update(leaf_value)
+            leaf_value = -leaf_value
+            node = node._parent
+
+    def is_leaf(self):
+        return self._actions is None
+
+    def is_root(self):
+        return self._parent is None
+
+    def get_id(self):
+        return id(self)
+
+    def get_proven(self):
+        return self._proven
+
+    def set_proven(self, result):
+        self._proven = result
+        if self._parent is not None:
+            self._parent._child_proven[self._index] = result
+
+    def update_proven(self):
+        #prove the node from its children: the player to move wins if one move wins, otherwise gets the best of the moves once all are proven
+        #return the result, or None if the node is not proven
+        if self._actions is None:
+            return None
+        if np.any(self._child_proven == 1):
+            self.set_proven(-1)
+        elif not np.any(np.isnan(self._child_proven)):
+            self.set_proven(-int(np.max(self._child_proven)))
+        return self._proven
+
+    def get_child_proven(self):
+        if self._actions is None:
+            return []
+        return [(act, None if np.isnan(result) else int(result)) for act, result in zip(self._actions.tolist(), self._child_proven)]
+
+    def get_child(self, action):
+        if self._actions is None:
+            return None
+        indices = np.flatnonzero(self._actions == action)
+        if len(indices) == 0:
+            return None
+        return self._children[indices[0]]
+
+    def get_child_visits(self):
+        if self._actions is None:
+            return []
+        return list(zip(self._actions.tolist(), self._child_visits.astype(np.int64).tolist()))
+
+    def make_root(self):
+        #detach the node from its parent, keeping its own subtree
+        self._parent = None
+        self._index = -1
+
+    def count_nodes(self):
+        n_nodes = 0
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            n_nodes += 1
+            if node._children is not None:
+                stack.extend(child for child in node._children if child is not None)
+        return n_nodes
+
+    def prune(self, min_visits):
+        #drop the child objects visited less than min_visits times with their subtrees, their statistics stay in the arrays
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node._children is None:
+                continue
+            for index, child in enumerate(node._children):
+                if child is None:
+                    continue
+                if node._child_visits[index] < min_visits:
+                    node._children[index] = None
+                else:
+                    stack.append(child)
+
+    def add_dirichlet_noise(self, weight, alpha):
+        #mix dirichlet noise into the priors of the children
+        self._priors = (1 - weight) * self._priors + weight * np.random.dirichlet(alpha * np.ones(len(self._priors)))
+
+    def add_virtual_loss(self, virtual_loss):
+        #count a pending visit as a loss, so that the other paths of a batch avoid this node
+        self._n_visits += 1
+        if self._parent is not None:
+            self._parent._child_visits[self._index] += 1
+            self._parent._child_value_sums[self._index] -= virtual_loss
+
+    def revert_virtual_loss(self, virtual_loss):
+        self._n_visits -= 1
+        if self._parent is not None:
+            self._parent._child_visits[self._index] -= 1
+            self._parent._child_value_sums[self._index] += virtual_loss
+
+#key of a position in the transposition graph
+#the repetitions and the fifty moves counter decide whether the game ends there, so they are part of the key
+def get_position_key(gp):
+    return gp.zobrist_key, gp.rep_counter.get(gp.zobrist_key, 0), gp.pawn_and_cap_move_counter[-1] >= 50
+
+#a position of the transposition graph, its edges keep their own visits and value sums
+#the node visits and value sums are kept in the arrays of the graph, so that they can be read for all children at once
+class DagNode(object):
+    def __init__(self, index):
+        self.index = index    #slot of the node statistics in the arrays of the graph
+        self._actions = None    #moves of the edges, None until the node is expanded
+        self._priors = None
+        self._edge_visits = None
+        self._edge_value_sums = None
+        self._child_indices = None    #slots of the child nodes, -1 for the edges never followed
+        self._children = None
+
+#positions searched by a transposition-aware MCTS, every position has one DagNode whatever the move order leading to it
+class TranspositionGraph(object):
+    def __init__(self, capacity=1024):
+        self.nodes = {}    #position key -> DagNode
+        self.node_visits = np.zeros(capacity)
+        self.node_value_sums = np.zeros(capacity)    #values from the perspective of the player who moved into the position
+        self.node_proven = np.full(capacity, np.nan)    #proven results from the same perspective, nan while unknown
+        self.n_nodes = 0
+        self.n_transpositions = 0    #edges leading to a position already in the graph
+        self.n_transposition_backups = 0    #playouts stopped at a position already searched through another move order
+
+    def get_node(self, gp):
+        key = get_position_key(gp)
+        node = self.nodes.get(key)
+        if node is not None:
+            self.n_transpositions += 1
+            return node
+        if self.n_nodes == len(self.node_visits):
+            self.node_visits = np.concatenate([self.node_visits, np.zeros(self.n_nodes)])
+            self.node_value_sums = np.concatenate([self.node_value_sums, np.zeros(self.n_nodes)])
+            self.node_proven = np.concatenate([self.node_proven, np.full(self.n_nodes, np.nan)])
+        node = DagNode(self.n_nodes)
+        self.n_nodes += 1
+        self.nodes[key] = node
+        return node
+
+    def resolve(self, path, gp):
+        #attach the node of the current position to the path, the move leading to it has just been made
+        if path.node is not None:
+            return
+        path.node = self.get_node(gp)
+        if path._parent is not None:
+            parent_node = path._parent.node
+            parent_node._children[path._edge] = path.node
+            parent_node._child_indices[path._edge] = path.node.index
+
+    def keep_subgraph(self, root):
+        #forget the positions that cannot be reached from the root any more and pack the statistics of the others
+        reachable = [root]
+        seen = {id(root)}
+        for node in reachable:
+            if node._children is not None:
+                for child in node._children:
+                    if child is not None and id(child) not in seen:
+                        seen.add(id(child))
+                        reachable.append(child)
+        old_indices = np.array([node.index for node in reachable], dtype=np.int64)
+        capacity = max(1024, 2 * len(reachable))
+        node_visits = np.zeros(capacity)
+        node_value_sums = np.zeros(capacity)
+        node_proven = np.full(capacity, np.nan)
+        node_visits[:len(reachable)] = self.node_visits[old_indices]
+        node_value_sums[:len(reachable)] = self.node_value_sums[old_indices]
+        node_proven[:len(reachable)] = self.node_proven[old_indices]
+        for index, node in enumerate(reachable):
+            node.index = index
+        for node in reachable:
+            if node._children is not None:
+                node._child_indices = np.array([child.index if child is not None else -1 for child in node._children], dtype=np.int64)
+        self.node_visits = node_visits
+        self.node_value_sums = node_value_sums
+        self.node_proven = node_proven
+        self.n_nodes = len(reachable)
+        self.nodes = {key: node for key, node in self.nodes.items() if id(node) in seen}
+
+#a step of the path followed by one playout in the transposition graph, with the same interface as TreeNode
+#the node is attached by TranspositionGraph.resolve once the move leading to it is made
+class DagPath(object):
+    def __init__(self, graph, node, parent=None, edge=-1):
+        self.graph = graph
+        self.node = node
+        self._parent = parent
+        self._edge = edge    #index of the edge taken from the parent node
+
+    def get_id(self):
+        return id(self.node)
+
+    def get_proven(self):
+        if self.node is None:
+            return None
+        result = self.graph.node_proven[self.node.index]
+        return None if np.isnan(result) else int(result)
+
+    def set_proven(self, result):
+        self.graph.node_proven[self.node.index] = result
+
+    def _get_child_proven_array(self):
+        indices = self.node._child_indices
+        return np.where(indices >= 0, self.graph.node_proven[indices], np.nan)
+
+    def update_proven(self):
+        #prove the position from its children: the player to move wins if one move wins, otherwise gets the best of the moves once all are proven
+        #return the result, or None if the position is not proven
+        if self.is_leaf():
+            return None
+        child_proven = self._get_child_proven_array()
+        if np.any(child_proven == 1):
+            self.set_proven(-1)
+        elif not np.any(np.isnan(child_proven)):
+            self.set_proven(-int(np.max(child_proven)))
+        return self.get_proven()
+
+    def get_child_proven(self):
+        if self.is_leaf():
+            return []
+        return [(act, None if np.isnan(result) else int(result)) for act, result in zip(self.node._actions.tolist(), self._get_child_proven_array())]
+
+    def expand(self, action_priors):
+        node = self.node
+        if node._actions is not None:
+            return    #already expanded through another move order
+        action_priors = list(action_priors)
+        if len(action_priors) == 0:
+            return
+        actions, priors = zip(*action_priors)
+        node._actions = np.array(actions, dtype=np.int64)
+        node._priors = np.array(priors, dtype=np.float64)
+        node._edge_visits = np.zeros(len(actions), dtype=np.float64)
+        node._edge_value_sums = np.zeros(len(actions), dtype=np.float64)
+        node._child_indices = -np.ones(len(actions), dtype=np.int64)
+        node._children = [None] * len(actions)
+
+    def select(self, c_puct):
+        #the value of an edge is the value of the position it leads to, learned through every move order reaching it
+        #the exploration term uses the visits of the edge itself, the moves proven to lose are never selected
+        node = self.node
+        graph = self.graph
+        indices = node._child_indices
+        #an edge not attached to a node (never followed or pruned) has only its own statistics
+        q = np.where(indices >= 0, graph.node_value_sums[indices] / np.maximum(graph.node_visits[indices], 1),
+                     node._edge_value_sums / np.maximum(node._edge_visits, 1))
+        u = c_puct * node._priors * np.sqrt(graph.node_visits[node.index]) / (1 + node._edge_visits)
+        index = int(np.argmax(np.where((indices >= 0) & (graph.node_proven[indices] == -1), -np.inf, q + u)))
+        return int(node._actions[index]), DagPath(graph, node._children[index], self, index)
+
+    def _add_to_stats(self, visits, value):
+        #add to the statistics of the node and of the edge leading to it
+        self.graph.node_visits[self.node.index] += visits
+        self.graph.node_value_sums[self.node.index] += value
+        if self._parent is not None:
+            self._parent.node._edge_visits[self._edge] += visits
+            self._parent.node._edge_value_sums[self._edge] += value
+
+    def update(self, leaf_value):
+        self._add_to_stats(1, leaf_value)
+
+    def update_recursive(self, leaf_value):
+        #update the path back to the root, the nodes shared with other paths are updated once for this playout
+        leaf_value = float(np.squeeze(leaf_value))
+        path = self
+        while path is not None:
+            path._add_to_stats(1, leaf_value)
+            leaf_value = -leaf_value
+            path = path._parent
+
+    def is_searched_elsewhere(self):
+        #whether the position has more visits, through other move orders, than the edge leading to it
+        return (self._parent is not None and self.node._actions is not None and
+                self.graph.node_visits[self.node.index] > self._parent.node._edge_visits[self._edge])
+
+    def update_from_transposition(self):
+        #back up the value the position already has instead of searching it again, without evaluating anything
+        #the node itself is not updated, so the edge catches up with it and is searched normally afterwards
+        graph = self.graph
+        value = graph.node_value_sums[self.node.index] / graph.node_visits[self.node.index]
+        self._parent.node._edge_visits[self._edge] += 1
+        self._parent.node._edge_value_sums[self._edge] += value
+        self._parent.update_recursive(-value)
+        graph.n_transposition_backups += 1
+
+    def add_virtual_loss(self, virtual_loss):
+        self._add_to_stats(1, -virtual_loss)
+
+    def revert_virtual_loss(self, virtual_loss):
+        self._add_to_stats(-1, virtual_loss)
+
+    def is_leaf(self):
+        return self.node is None or self.node._actions is None
+
+    def is_root(self):
+        return self._parent is None
+
+    def get_child(self, action):
+        if self.is_leaf():
+            return None
+        indices = np.flatnonzero(self.node._actions == action)
+        if len(indices) == 0 or self.node._children[indices[0]] is None:
+            return None
+        return DagPath(self.graph, self.node._children[indices[0]])
+
+    def get_child_visits(self):
+        if self.is_leaf():
+            return []
+        return list(zip(self.node._actions.tolist(), self.node._edge_visits.astype(np.int64).tolist()))
+
+    def make_root(self):
+        self._parent = None
+        self._edge = -1
+        self.graph.keep_subgraph(self.node)
+
+    def count_nodes(self):
+        return self.graph.n_nodes if self.node is not None else 0
+
+    def prune(self, min_visits):
+        #detach the edges followed less than min_visits times, then forget the positions no longer reachable
+        if self.node is None:
+            return
+        stack = [self.node]
+        seen = {id(self.node)}
+        while stack:
+            node = stack.pop()
+            if node._children is None:
+                continue
+            for index, child in enumerate(node._children):
+                if child is None:
+                    continue
+                if node._edge_visits[index] < min_visits:
+                    node._children[index] = None
+                    node._child_indices[index] = -1
+                elif id(child) not in seen:
+                    seen.add(id(child))
+                    stack.append(child)
+        self.graph.keep_subgraph(self.node)
+
+    def add_dirichlet_noise(self, weight, alpha):
+        node = self.node
+        node._priors = (1 - weight) * node._priors + weight * np.random.dirichlet(alpha * np.ones(len(node._priors)))
+
+def new_root_node(tree_storage):
+    if tree_storage == 'dict':
+        return TreeNode(None, 1.0)
+    elif tree_storage == 'array':
+        return ArrayTreeNode(None)
+    elif tree_storage == 'dag':
+        return DagPath(TranspositionGraph(), None)
+    raise ValueError('unknown tree storage: ' + str(tree_storage))
+
+#evaluates the leaves sent by several search threads together, in one call of the batch policy
+class BatchEvaluator(object):
+    def __init__(self, batch_policy_value_fn, max_batch_size, max_wait=0.001):
+        self._batch_policy = batch_policy_value_fn
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait    #seconds to wait for more leaves before evaluating an incomplete batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self.n_batches = 0
+        self.n_evaluated = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def evaluate(self, position, legal_moves_id_list):
+        #called by the search threads, block until the batch of the leaf is evaluated and return (move probs, eval)
+        request = [position, legal_moves_id_list, threading.Event(), None, None] #the last two are the result and the error
+        self._queue.put(request)
+        request[2].wait()
+        if request[4] is not None:
+            raise request[4]
+        return request[3]
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch = [request]
+            stop = False
+            while len(batch) < self._max_batch_size:
+                try:
+                    request = self._queue.get(timeout=self._max_wait)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+            try:
+                results = self._batch_policy([request[0] for request in batch], [request[1] for request in batch])
+                for request, result in zip(batch, results):
+                    request[3] = result
+            except Exception as error:
+                for request in batch:
+                    request[4] = error
+            self.n_batches += 1
+            self.n_evaluated += len(batch)
+            for request in batch:
+                request[2].set()
+            if stop:
+                return
+
 class MonteCarloTreeSearch(object):
-    def __init__(self, policy_value_fn, c_puct=5, n_playout=2000):
+    def __init__(self, policy_value_fn, c_puct=5, n_playout=2000, tree_storage=None,
+                 batch_policy_value_fn=None, eval_batch_size=None, virtual_loss=None, search_threads=None, eval_cache=None,
+                 early_stop=None, time_limit=None, max_tree_nodes=None):
         #recieve the position, output the move probs and eval
-        self._root = TreeNode(None, 1.0)
+        #tree_storage: 'dict' (one TreeNode per child), 'array' (children statistics in numpy arrays)
+        #or 'dag' (transpositions share one node, see TranspositionGraph)
+        #batch_policy_value_fn: receive a list of position arrays and a list of legal move ids, output a list of (move probs, eval),
+        #used to evaluate eval_batch_size leaves at once, the playouts are done one by one without it
+        #search_threads: number of threads searching the same tree, their leaves are evaluated together by a BatchEvaluator
+        #eval_cache: EvalCache looked up before evaluating a leaf, it can be shared with other searches using the same model
+        #early_stop: stop the playouts of a move once the most visited move cannot be overtaken
+        #time_limit: seconds of search per move, None for no limit
+        #max_tree_nodes: the least visited subtrees are pruned between moves when the tree grows bigger, None for no limit
+        self._tree_storage = CONFIG['tree_storage'] if tree_storage is None else tree_storage
+        self._root = new_root_node(self._tree_storage)
         self._policy = policy_value_fn
+        self._batch_policy = batch_policy_value_fn
         self._c_puct = c_puct
         self._n_playout = n_playout
+        self._eval_batch_size = CONFIG['eval_batch_size'] if eval_batch_size is None else eval_batch_size
+        self._virtual_loss = CONFIG['virtual_loss'] if virtual_loss is None else virtual_loss
+        self._search_threads = CONFIG['search_threads'] if search_threads is None else search_threads
+        self._eval_cache = eval_cache
+        self._cache_generation = eval_cache.generation if eval_cache is not None else None    #generation of the cache the tree was searched with
+        self._early_stop = CONFIG['early_stop'] if early_stop is None else early_stop
+        self._time_limit = CONFIG['move_time_limit'] if time_limit is None else time_limit
+        self._deadline = None
+        self._max_tree_nodes = CONFIG['max_tree_nodes'] if max_tree_nodes is None else max_tree_nodes
+        #the root is the position reached after root_len moves of the game, None if unknown
+        self._root_len = None
+        self._root_key = None
+        self.n_prunings = 0
+        self.n_playouts_done = 0
+        self.n_playouts_saved = 0    #playouts of the budget not needed, by forced moves and early stops
+        self.collisions = 0    #batches cut short (or threads waiting) because a leaf was selected twice
+        #state shared by the search threads
+        #the lock of a node guards its expansion and the statistics of its children, see _get_node_lock
+        self._node_locks = [threading.Lock() for i in range(NODE_LOCK_STRIPES)]
+        self._lock = threading.Lock()    #guards the counters and the pending leaves, never the tree
+        self._pending = {}    #id (get_id) of a leaf being evaluated -> event set when it is expanded
+        self._n_started = 0
+        self._n_threaded_done = 0
 
     def _playout(self, gp):
         #do a search, update the params of the treenodes by the eval of leafnodes
-        #note that the game position is changed
+        #the moves made along the path are taken back at the end, so the game position is unchanged
+        moves_made = 0
+        try:
+            node, moves_made = self._select_leaf(gp)
+            if node is not None:
+                self._evaluate_and_update(gp, node)
+        finally:
+            for i in range(moves_made):
+                gp.undo_move()
+
+    def _select_leaf(self, gp):
+        #walk from the root to a leaf making the moves on the game position
+        #return the leaf and the number of moves made, the caller has to take them back
+        #the leaf is None when the playout ended without needing an evaluation, on a transposition or a proven node
         node = self._root
-        while True:
-            if node.is_leaf():
-                break
-            action, node = node.select(self._c_puct)
-            gp.make_move_by_id(action)
+        moves_made = 0
+        try:
+            if self._tree_storage == 'dag':
+                node.graph.resolve(node, gp)
+            while True:
+                if node.is_leaf():
+                    break
+                action, node = node.select(self._c_puct)
+                gp.make_move_by_id(action)
+                moves_made += 1
+                if self._tree_storage == 'dag':
+                    node.graph.resolve(node, gp)
+                if node.get_proven() is not None:
+                    #the result of the subtree is known, back it up without searching it again
+                    node.update_recursive(node.get_proven())
+                    self._propagate_proven(node._parent)
+                    return None, moves_made
+                if self._tree_storage == 'dag' and node.is_searched_elsewhere():
+                    node.update_from_transposition()
+                    return None, moves_made
+        except:
+            for i in range(moves_made):
+                gp.undo_move()
+            raise
+        return node, moves_made
 
+    def _evaluate_and_update(self, gp, node):
         #use net to eval nodes, the net should output the list of (action, prob) and the score of current player [-1, 1]
-        action_probs, leaf_value = self._policy(gp)
-        
-        #check whether the game ends
-        if gp.stalemate or gp.fifty_moves_draw or gp.three_rep_draw:
-            end = True
-            winner = None
-        elif gp.checkmate:
-            end = True
-            winner = 1 if (not gp.white_turn) else -1
+        cached = self._eval_cache.get(get_eval_key(gp)) if self._eval_cache is not None else None
+        if cached is None:
+            action_probs, leaf_value = self._policy(gp)
+            if self._eval_cache is not None:
+                action_probs = self._eval_cache.put(get_eval_key(gp), action_probs, leaf_value)
         else:
-            end = False
-            winner = None
-
-        if not end:
-            node.expand(action_probs)
-        else:
-            #if ends, subtitude the values of treenodes by 1 or 0
-            if winner is None:    #Draw
-                leaf_value = 0.0
-            else:   #the current player must win, one cannot lose immediately by making a move
-                leaf_value = 1.0
+            gp.get_legal_moves()    #the end of the game is checked below
+            action_probs, leaf_value = cached
+        
+        end_value = self._get_end_value(gp)
+        if end_value is not None:
+            self._update_end(node, end_value)
+            return
+        node.expand(action_probs)
         
         #update nodes and visiting times
         #the negetive sign should be added since the two players use a same tree
         node.update_recursive(-leaf_value)
 
+    def _get_end_value(self, gp):
+        #check whether the game ends, the legal moves of the position must have been generated
+        #if ends, subtitude the values of treenodes by -1 or 0 (from the perspective of the current player), otherwise return None
+        if gp.stalemate or gp.fifty_moves_draw or gp.three_rep_draw:
+            return 0.0    #Draw
+        elif gp.checkmate:
+            return -1.0    #the current player is checkmated, the player who just moved wins
+        return None
+
+    def _update_end(self, node, end_value):
+        #the game ends at the node: its result is proven, update the tree and prove the ancestors that can be
+        node.set_proven(-int(end_value))
+        node.update_recursive(-end_value)
+        self._propagate_proven(node._parent)
+
+    def _propagate_proven(self, node):
+        while node is not None and node.update_proven() is not None:
+            node = node._parent
+
+    def _playout_batch(self, gp, n_leaves):
+        #select up to n_leaves leaves, evaluate them in one call of the batch policy, then expand and update them all
+        #return the number of playouts done
+        n_done, batch = self._select_batch(gp, n_leaves)
+        leaves, keys, position_batch, legal_moves_batch = batch
+        if len(leaves) > 0:
+            n_done += self._update_batch(batch, self._batch_policy(position_batch, legal_moves_batch))
+        return n_done
+
+    def _select_batch(self, gp, n_leaves):
+        #select up to n_leaves leaves needing an evaluation, the game position is unchanged
+        #every pending path takes a virtual loss, so the next paths of the batch go to other parts of the tree
+        #return the number of playouts done without evaluation and the batch (leaves, cache keys, position arrays, legal move ids)
+        leaves, keys, position_batch, legal_moves_batch = [], [], [], []
+        pending = set()
+        n_done = 0
+        for i in range(n_leaves):
+            moves_made = 0
+            try:
+                node, moves_made = self._select_leaf(gp)
+                if node is None:
+                    n_done += 1
+                    continue
+                legal_moves_id_list = gp.get_legal_moves(return_ids=True)
+                end_value = self._get_end_value(gp)
+                if end_value is not None:
+                    #terminal positions need no evaluation
+                    self._update_end(node, end_value)
+                    n_done += 1
+                elif node.get_id() in pending:
+                    #the leaf is already waiting for its evaluation, the virtual loss was not enough to avoid it
+                    self.collisions += 1
+                    break
+                else:
+                    key = get_eval_key(gp)
+                    cached = self._eval_cache.get(key) if self._eval_cache is not None else None
+                    if cached is not None:
+                        node.expand(cached[0])
+                        node.update_recursive(-cached[1])
+                        n_done += 1
+                        continue
+                    pending.add(node.get_id())
+                    self._add_virtual_loss(node)
+                    leaves.append(node)
+                    keys.append(key)
+                    position_batch.append(gp.get_array())
+                    legal_moves_batch.append(legal_moves_id_list)
+            finally:
+                for j in range(moves_made):
+                    gp.undo_move()
+        return n_done, (leaves, keys, position_batch, legal_moves_batch)
+
+    def _update_batch(self, batch, results):
+        #expand and update the leaves of a batch with their (move probs, eval), return the number of playouts done
+        leaves, keys = batch[0], batch[1]
+        n_done = 0
+        for node, key, (action_probs, leaf_value) in zip(leaves, keys, results):
+            if self._eval_cache is not None:
+                action_probs = self._eval_cache.put(key, action_probs, leaf_value)
+            self._revert_virtual_loss(node)
+            node.expand(action_probs)
+            node.update_recursive(-leaf_value)
+            n_done += 1
+        return n_done
+
+    def _search_thread(self, gp, evaluator, errors):
+        #start playouts until the playouts of the move are all started
+        try:
+            while True:
+                with self._lock:
+                    if self._n_started >= self._n_playout:
+                        return
+                    if self._n_started % STOP_CHECK_INTERVAL == 0:
+                        with self._get_node_lock(self._root):
+                            stop = self._should_stop(self._n_started)
+                        if stop:
+                            self._n_started = self._n_playout    #stop the other threads too
+                            return
+                    self._n_started += 1
+                    self._n_threaded_done += 1
+                self._threaded_playout(gp, evaluator)
+        except Exception as error:
+            errors.append(error)
+
+    def _get_node_lock(self, node):
+        #lock guarding the expansion of the node and the statistics of its children, a thread holds one node lock at a time
+        #the positions of the dag are shared by many paths and their statistics are in arrays of the whole graph, so it has one lock
+        if self._tree_storage == 'dag':
+            return self._node_locks[0]
+        return self._node_locks[(node.get_id() >> 4) % NODE_LOCK_STRIPES]
+
+    def _get_stats_lock(self, node):
+        #the statistics of a node are read by the selection at its parent, so they are guarded by the lock of the parent
+        return self._get_node_lock(node._parent if node._parent is not None else node)
+
+    def _select_leaf_threaded(self, gp):
+        #the same as _select_leaf for a search thread, the nodes are locked one at a time
+        #every node of the path gets its virtual loss as soon as it is selected, so the other threads go to other parts of the tree
+        #return the leaf and the number of moves made, the leaf is None when the playout is already backed up
+        node = self._root
+        moves_made = 0
+        try:
+            with self._get_node_lock(node):
+                if self._tree_storage == 'dag':
+                    node.graph.resolve(node, gp)
+                node.add_virtual_loss(self._virtual_loss)
+            while True:
+                with self._get_node_lock(node):
+                    if node.is_leaf():
+                        break
+                    action, child = node.select(self._c_puct)
+                    gp.make_move_by_id(action)
+                    moves_made += 1
+                    if self._tree_storage == 'dag':
+                        child.graph.resolve(child, gp)
+                    child.add_virtual_loss(self._virtual_loss)
+                node = child
+                if node.get_proven() is not None:
+                    #the result of the subtree is known, back it up without searching it again
+                    self._backup_threaded(node, node.get_proven())
+                    self._propagate_proven_threaded(node._parent)
+                    return None, moves_made
+                if self._tree_storage == 'dag' and node.is_searched_elsewhere():
+                    self._revert_virtual_loss_threaded(node)
+                    with self._get_node_lock(node):
+                        node.update_from_transposition()
+                    return None, moves_made
+        except:
+            for i in range(moves_made):
+                gp.undo_move()
+            raise
+        return node, moves_made
+
+    def _revert_virtual_loss_threaded(self, node):
+        while node is not None:
+            with self._get_stats_lock(node):
+                node.revert_virtual_loss(self._virtual_loss)
+            node = node._parent
+
+    def _backup_threaded(self, node, leaf_value):
+        #take back the virtual loss of the path and back up the value, changing the perspective of player at each step
+        leaf_value = float(np.squeeze(leaf_value))
+        while node is not None:
+            with self._get_stats_lock(node):
+                node.revert_virtual_loss(self._virtual_loss)
+                node.update(leaf_value)
+            leaf_value = -leaf_value
+            node = node._parent
+
+    def _propagate_proven_threaded(self, node):
+        while node is not None:
+            with self._get_node_lock(node):
+                result = node.update_proven()
+            if result is None:
+                return
+            node = node._parent
+
+    def _threaded_playout(self, gp, evaluator):
+        #one playout of a search thread, only the evaluation waits on the BatchEvaluator
+        moves_made = 0
+        try:
+            while True:
+                node, moves_made = self._select_leaf_threaded(gp)
+                if node is None:
+                    return
+                legal_moves_id_list = gp.get_legal_moves(return_ids=True)
+                end_value = self._get_end_value(gp)
+                if end_value is not None:
+                    #the game ends at the node: its result is proven, update the tree and prove the ancestors that can be
+                    with self._get_stats_lock(node):
+                        node.set_proven(-int(end_value))
+                    self._backup_threaded(node, -end_value)
+                    self._propagate_proven_threaded(node._parent)
+                    return
+                with self._lock:
+                    #the leaf may have been expanded by another thread since it was selected
+                    expanded = not node.is_leaf()
+                    wait_for = None if expanded else self._pending.get(node.get_id())
+                    if not expanded and wait_for is None:
+                        self._pending[node.get_id()] = threading.Event()
+                    else:
+                        self.collisions += 1
+                if not expanded and wait_for is None:
+                    break
+                #another thread is evaluating this leaf or has expanded it, select again
+                self._revert_virtual_loss_threaded(node)
+                for i in range(moves_made):
+                    gp.undo_move()
+                moves_made = 0
+                if wait_for is not None:
+                    wait_for.wait()
+
+            try:
+                key = get_eval_key(gp)
+                cached = self._eval_cache.get(key) if self._eval_cache is not None else None
+                if cached is not None:
+                    action_probs, leaf_value = cached
+                else:
+                    action_probs, leaf_value = evaluator.evaluate(gp.get_array(), legal_moves_id_list)
+                    if self._eval_cache is not None:
+                        action_probs = self._eval_cache.put(key, action_probs, leaf_value)
+            except:
+                self._revert_virtual_loss_threaded(node)
+                raise
+            else:
+                with self._get_node_lock(node):
+                    node.expand(action_probs)
+                self._backup_threaded(node, -leaf_value)
+            finally:
+                with self._lock:
+                    self._pending.pop(node.get_id()).set()
+        finally:
+            for i in range(moves_made):
+                gp.undo_move()
+
+    def _threaded_search(self, gp, n_started=0):
+        #every thread plays on its own copy of the position, return the number of playouts done by the threads
+        evaluator = BatchEvaluator(self._batch_policy, min(self._eval_batch_size, self._search_threads))
+        errors = []
+        self._n_started = n_started
+        self._n_threaded_done = 0
+        evaluator.start()
+        try:
+            threads = [threading.Thread(target=self._search_thread, args=(copy.deepcopy(gp), evaluator, errors))
+                       for i in range(self._search_threads)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            evaluator.stop()
+        if len(errors) > 0:
+            raise errors[0]
+        return self._n_threaded_done
+
+    def _add_virtual_loss(self, node):
+        #from the leaf to the root
+        while node is not None:
+            node.add_virtual_loss(self._virtual_loss)
+            node = node._parent
+
+    def _revert_virtual_loss(self, node):
+        while node is not None:
+            node.revert_virtual_loss(self._virtual_loss)
+            node = node._parent
+
     def get_move_probs(self, gp, temp=1e-3):
         #do all search in order, and return vaild moves and corresponding probs
         #temp: tempreture, in (0, 1]
 
-        for n in range(self._n_playout):
-            gp_copy = copy.deepcopy(gp)
-            self._playout(gp_copy)
+        legal_moves_id_list = gp.get_legal_moves(return_ids=True)
+        if len(legal_moves_id_list) == 1 and self._early_stop:
+            #forced move, no search needed
+            self.n_playouts_saved += self._n_playout
+            return tuple(legal_moves_id_list), np.array([1.0])
+
+        self.run_playouts(gp)
+        return self.get_root_move_probs(temp)
+
+    def get_root_move_probs(self, temp=1e-3):
+        #the moves of the root and their probs after the search
+        #a move proven to win is played at once
+        child_proven = dict(self._root.get_child_proven())
+        for act, result in child_proven.items():
+            if result == 1:
+                return (act,), np.array([1.0])
 
         #calculate the moving prob using the visiting times of the root node
-        act_visits= [(act, node._n_visits)
-                     for act, node in self._root._children.items()]
+        act_visits = self._root.get_child_visits()
         acts, visits = zip(*act_visits)
-        act_probs = softmax(1.0 / temp * np.log(np.array(visits) + 1e-10))
+        visits = np.array(visits, dtype=np.float64)
+        losing = np.array([child_proven.get(act) == -1 for act in acts])
+        if not np.all(losing):
+            visits[losing] = 0    #never play a move proven to lose if another one exists
+        act_probs = softmax(1.0 / temp * np.log(visits + 1e-10))
         return acts, act_probs    
 
+    def run_playouts(self, gp, n_done=0):
+        #do the playouts of one move, the game position is unchanged
+        #n_done: playouts of the move already done by the caller, they count in the n_playout budget
+        #return the number of playouts done including them, fewer than n_playout if the search stopped early
+        self._deadline = time.perf_counter() + self._time_limit if self._time_limit is not None else None
+        if self._batch_policy is not None and self._search_threads > 1:
+            n_done += self._threaded_search(gp, n_done)
+        elif self._batch_policy is not None and self._eval_batch_size > 1:
+            while n_done < self._n_playout and not self._should_stop(n_done):
+                n_done += self._playout_batch(gp, min(self._eval_batch_size, self._n_playout - n_done))
+        else:
+            while n_done < self._n_playout:
+                if n_done % STOP_CHECK_INTERVAL == 0 and self._should_stop(n_done):
+                    break
+                self._playout(gp)
+                n_done += 1
+        self._deadline = None
+        self.n_playouts_done += n_done
+        self.n_playouts_saved += self._n_playout - n_done
+        return n_done
+
+    def _should_stop(self, n_done):
+        #whether the search of the move can stop before n_playout playouts
+        if self._root.get_proven() is not None:
+            return True    #the result of the game is known
+        if self._deadline is not None and n_done > 0 and time.perf_counter() > self._deadline:
+            return True
+        if self._early_stop:
+            visits = sorted((n_visits for act, n_visits in self._root.get_child_visits()), reverse=True)
+            #the remaining playouts cannot make the second move overtake the first one
+            if len(visits) >= 2 and visits[0] - visits[1] > self._n_playout - n_done:
+                return True
+        return False
+
     def update_with_move(self, last_move):
         #update in the current tree, keep everything we know about the tree
-        if last_move in self._root._children:
-            self._root = self._root._children[last_move]
-            self._root._parent = None
+        child = self._root.get_child(last_move)
+        if child is not None:
+            self._root = child
+            self._root.make_root()
+        else:
+            self._root = new_root_node(self._tree_storage)
+        self._root_key = None    #the game position of the root is only known through sync_with_game
+
+    def sync_with_game(self, gp):
+        #move the root to the game position, following the moves played since the last search (ours and the opponent's)
+        #the tree is dropped if the game position does not follow from the root, e.g. a new game or a taken back move,
+        #or if the evaluation cache was cleared since the last search, the model of the tree is then an old one
+        n_moves = len(gp.move_history)
+        if self._eval_cache is not None and self._eval_cache.generation != self._cache_generation:
+            self._cache_generation = self._eval_cache.generation
+            self._root_key = None
+        if self._root_key is not None and n_moves >= self._root_len and gp.zobrist_key_log[self._root_len] == self._root_key:
+            for move in gp.move_history[self._root_len:]:
+                self.update_with_move(get_move_id(move))
         else:
-            self._root = TreeNode(None, 1.0)
+            self.update_with_move(-1)
+        self._root_len = n_moves
+        self._root_key = gp.zobrist_key
+        self.limit_tree_size()
+
+    def limit_tree_size(self):
+        #prune the least visited subtrees when the tree has more than max_tree_nodes nodes,
+        #down to half of the limit so that it is not pruned again at every move
+        if self._max_tree_nodes is None or self._root.count_nodes() <= self._max_tree_nodes:
+            return
+        max_visits = max([n_visits for act, n_visits in self._root.get_child_visits()] + [0])
+        min_visits = 1
+        while min_visits <= max_visits:
+            min_visits *= 2
+            self._root.prune(min_visits)
+            if self._root.count_nodes() <= self._max_tree_nodes // 2:
+                break
+        self.n_prunings += 1
 
     def __str__(self):
         return 'MCTS'    
     
 #AI player based on MCTS
 class MCTSPlayer(object):
-    def __init__(self, policy_value_function, c_puct=5, n_playout=2000, is_selfplay=0):
-        self.mcts = MonteCarloTreeSearch(policy_value_function, c_puct, n_playout)
+    def __init__(self, policy_value_function, c_puct=5, n_playout=2000, is_selfplay=0, tree_storage=None,
+                 batch_policy_value_function=None, eval_batch_size=None, virtual_loss=None, search_threads=None, eval_cache=None,
+                 early_stop=None, time_limit=None, max_tree_nodes=None):
+        self.mcts = MonteCarloTreeSearch(policy_value_function, c_puct, n_playout, tree_storage,
+                                         batch_policy_value_function, eval_batch_size, virtual_loss, search_threads, eval_cache,
+                                         early_stop, time_limit, max_tree_nodes)
         self._is_selfplay = is_selfplay
         self.agent = "AI"
 
     def set_player_ind(self, p):
         self.player = p
 
+    #total playouts done and saved by the searches of the player
+    def get_playout_stats(self):
+        return self.mcts.n_playouts_done, self.mcts.n_playouts_saved
+
     #reset the searching tree
     def reset_player(self):
         self.mcts.update_with_move(-1)
@@ -145,6 +1109,8 @@ class MCTSPlayer(object):
         #return the pi vector from MCTS algorism, just like the alphaGO_Zero paper
         move_probs = np.zeros(1968)
 
+        #reuse the subtree of the position reached by the moves played since the last search
+        self.mcts.sync_with_game(gp)
         acts, probs = self.mcts.get_move_probs(gp, temp)
         move_probs[list(acts)] = probs
         if self._is_selfplay:
@@ -153,12 +1119,8 @@ class MCTSPlayer(object):
                 acts,
                 p=0.75*probs + 0.25*np.random.dirichlet(CONFIG['dirichlet'] * np.ones(len(probs)))
             )
-            #refresh the root node, and reuse searching tree
-            self.mcts.update_with_move(move)
         else:
             move = np.random.choice(acts, p=probs)
-            #refresh the root node
-            self.mcts.update_with_move(-1)
         if return_prob:
             return move, move_probs
         else:
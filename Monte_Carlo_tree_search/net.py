@@ -3,6 +3,8 @@ import torch.nn as nn
 import numpy as np
 import torch.nn.functional as F
 from torch.cuda.amp import autocast
+from config import CONFIG
+from eval_cache import EvalCache
 
 #Define residue block
 class ResBlock(nn.Module):
@@ -82,9 +84,16 @@ class PolicyValueNet:
         self.l2_const = 2e-3
         self.policy_value_net = Net().to(self.device)
         self.optimizer = torch.optim.Adam(params=self.policy_value_net.parameters(), lr=1e-3, betas=(0.9, 0.999), eps=1e-8, weight_decay=self.l2_const)
+        #evaluations of the positions met by the searches using this net
+        self.eval_cache = EvalCache(CONFIG['eval_cache_mb'])
         if model_file:
             self.policy_value_net.load_state_dict(torch.load(model_file))
             
+    #load a new checkpoint, the cached evaluations of the old model are dropped
+    def load_model(self, model_file):
+        self.policy_value_net.load_state_dict(torch.load(model_file))
+        self.eval_cache.clear()
+
     
     #input a batch of positions, output the proba of moves and evaluation
     def policy_value(self, position_batch):
@@ -113,12 +122,33 @@ class PolicyValueNet:
         #return move_probs, value.detach().numpy()
         return move_probs, value.detach().to(torch.float16).numpy()
     
+    #given the arrays and legal move ids of several positions, return the legal moves and eval of each one
+    #the positions are evaluated in a single forward pass
+    def policy_value_fn_batch(self, position_batch, legal_moves_batch):
+        legal_probs, values = self.policy_value_arrays(position_batch, legal_moves_batch)
+        return [(zip(legal_moves_id_list, legal_probs[i]), values[i])
+                for i, legal_moves_id_list in enumerate(legal_moves_batch)]
+
+    #the same as policy_value_fn_batch, but return the probs of the legal moves of each position as an array and the evals as one array
+    def policy_value_arrays(self, position_batch, legal_moves_batch):
+        self.policy_value_net.eval()
+        cur_positions = np.ascontiguousarray(np.array(position_batch).reshape(-1, 9, 8, 8)).astype('float16')
+        cur_positions = torch.as_tensor(cur_positions).to(self.device)
+        #predict by nn
+        with torch.no_grad(), torch.amp.autocast(device_type="cuda" if torch.cuda.is_available() else "cpu"):
+            log_move_probs, values = self.policy_value_net(cur_positions)
+        move_probs = np.exp(log_move_probs.cpu().to(torch.float16).numpy())
+        values = values.cpu().to(torch.float16).numpy()
+        #only take legal moves
+        return [move_probs[i][legal_moves_id_list] for i, legal_moves_id_list in enumerate(legal_moves_batch)], values
+
     #save model
     def save_model(self, model_file):
         torch.save(self.policy_value_net.state_dict(), model_file)
     
     def train_step(self, position_batch, mcts_probs, winner_batch, lr = 0.002):
         self.policy_value_net.train()
+        self.eval_cache.clear()    #the weights are about to change
         position_batch = torch.tensor(position_batch).to(self.device)
         mcts_probs = torch.tensor(mcts_probs).to(self.device)
         winner_batch = torch.tensor(winner_batch).to(self.device)   
@@ -0,0 +1,182 @@
+#replay buffer stored as shards of .npy files in a directory
+#the writer only appends the samples of the new games, the readers memory map the shards and read the sampled rows only
+#index.json lists the shards and how many samples of each are written, it is replaced atomically once the samples are on the disk
+#a shard dropped from the index is deleted at the next write of the index, so the readers of the previous index can still open it
+#the samples are kept in the compact encoding of compact_samples
+#a buffer opened for writing holds an exclusive lock on writer.lock, a second writer fails at once
+import os
+import json
+import numpy as np
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+from config import CONFIG
+from compact_samples import POSITION_BYTES, MAX_POLICY_MOVES, decode_samples
+
+INDEX_NAME = 'index.json'
+LOCK_NAME = 'writer.lock'
+#fields of a sample: name -> (shape of one sample, dtype)
+SAMPLE_FIELDS = {
+    'position_bits': ((POSITION_BYTES,), np.uint8),
+    'move_ids': ((MAX_POLICY_MOVES,), np.int16),
+    'move_probs': ((MAX_POLICY_MOVES,), np.float16),
+    'winners': ((), np.int8),
+}
+
+class ReplayBuffer(object):
+    def __init__(self, path=None, buffer_size=None, shard_size=None, writer=False):
+        self.path = CONFIG['replay_buffer_path'] if path is None else path
+        self.buffer_size = CONFIG['buffer_size'] if buffer_size is None else buffer_size    #the samples are drawn from the last buffer_size ones
+        self.shard_size = CONFIG['replay_shard_size'] if shard_size is None else shard_size
+        os.makedirs(self.path, exist_ok=True)
+        self.shards = []    #list of {'name': shard name, 'size': samples written}, the oldest first
+        self.retired = []    #names of the shards dropped by the last write of the index, deleted by the next one
+        self.next_shard = 0
+        self.iters = 0
+        self._index_stamp = None
+        self._arrays = {}    #shard name -> {field: memory mapped array}
+        self._lock_file = None
+        if writer:
+            self._lock_writer()
+        self.reload()
+
+    def __len__(self):
+        return min(self.buffer_size, sum(shard['size'] for shard in self.shards))
+
+    def _lock_writer(self):
+        #the lock is released by close or when the process ends, so a crashed writer leaves no stale lock
+        lock_file = open(os.path.join(self.path, LOCK_NAME), 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            raise RuntimeError('the replay buffer {} is already opened for writing by another process'.format(self.path))
+        self._lock_file = lock_file
+
+    #release the writer lock
+    def close(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _get_file(self, name, field):
+        return os.path.join(self.path, '{}_{}.npy'.format(name, field))
+
+    def reload(self):
+        #read the index again if another process changed it
+        index_path = os.path.join(self.path, INDEX_NAME)
+        if not os.path.exists(index_path):
+            return
+        stat = os.stat(index_path)
+        index_stamp = (stat.st_mtime_ns, stat.st_ino)    #the index is replaced by a new file at every change
+        if index_stamp == self._index_stamp:
+            return
+        with open(index_path) as index_file:
+            index = json.load(index_file)
+        self.shards = index['shards']
+        self.retired = index.get('retired', [])
+        self.next_shard = index['next_shard']
+        self.iters = index['iters']
+        self._index_stamp = index_stamp
+        names = set(shard['name'] for shard in self.shards)
+        self._arrays = {name: arrays for name, arrays in self._arrays.items() if name in names}
+
+    def _write_index(self):
+        index_path = os.path.join(self.path, INDEX_NAME)
+        with open(index_path + '.tmp', 'w') as index_file:
+            json.dump({'shards': self.shards, 'retired': self.retired, 'next_shard': self.next_shard, 'iters': self.iters}, index_file)
+        os.replace(index_path + '.tmp', index_path)
+        stat = os.stat(index_path)
+        self._index_stamp = (stat.st_mtime_ns, stat.st_ino)
+
+    def _get_arrays(self, name, mode='r'):
+        arrays = self._arrays.get(name)
+        if arrays is None or (mode == 'r+' and arrays['mode'] != 'r+'):
+            arrays = {field: np.load(self._get_file(name, field), mmap_mode=mode) for field in SAMPLE_FIELDS}
+            arrays['mode'] = mode
+            self._arrays[name] = arrays
+        return arrays
+
+    def _create_shard(self):
+        #the files of a shard get their full size at once, and their final names when they are complete
+        name = 'shard_{:06d}'.format(self.next_shard)
+        self.next_shard += 1
+        for field, (shape, dtype) in SAMPLE_FIELDS.items():
+            tmp_file = self._get_file(name, field) + '.tmp'
+            array = np.lib.format.open_memmap(tmp_file, mode='w+', dtype=dtype, shape=(self.shard_size,) + shape)
+            array.flush()
+            del array
+            os.replace(tmp_file, self._get_file(name, field))
+        self.shards.append({'name': name, 'size': 0})
+
+    #append the samples of a game encoded by encode_game, the buffer must be opened for writing
+    def add_game(self, game):
+        if self._lock_file is None:
+            raise RuntimeError('the replay buffer {} is not opened for writing'.format(self.path))
+        self.reload()
+        n_game_samples = len(game['winners'])
+        i = 0
+        while i < n_game_samples:
+            if len(self.shards) == 0 or self.shards[-1]['size'] == self.shard_size:
+                self._create_shard()
+            shard = self.shards[-1]
+            arrays = self._get_arrays(shard['name'], 'r+')
+            n = min(self.shard_size - shard['size'], n_game_samples - i)
+            for field in SAMPLE_FIELDS:
+                arrays[field][shard['size']:shard['size'] + n] = game[field][i:i + n]
+                arrays[field].flush()
+            shard['size'] += n
+            i += n
+        self.iters += 1
+        #forget the oldest shards once the others hold buffer_size samples
+        dropped = []
+        n_samples = sum(shard['size'] for shard in self.shards)
+        while len(self.shards) > 1 and n_samples - self.shards[0]['size'] >= self.buffer_size:
+            n_samples -= self.shards[0]['size']
+            dropped.append(self.shards.pop(0)['name'])
+        #the shards dropped by the previous write are deleted, no reader of the new index can need them
+        retired = self.retired
+        self.retired = dropped
+        self._write_index()
+        for name in dropped + retired:
+            self._arrays.pop(name, None)
+        for name in retired:
+            for field in SAMPLE_FIELDS:
+                try:
+                    os.remove(self._get_file(name, field))
+                except FileNotFoundError:
+                    pass
+
+    #draw batch_size different samples from the last buffer_size ones, return the positions, move probs and winners
+    #as dense float32 arrays, the batch is decoded at once
+    def sample(self, batch_size):
+        self.reload()
+        try:
+            return self._sample(batch_size)
+        except FileNotFoundError:
+            #the index was read more than one write ago and a shard of it is deleted, sample from the new index
+            self._index_stamp = None
+            self.reload()
+            return self._sample(batch_size)
+
+    def _sample(self, batch_size):
+        sizes = np.array([shard['size'] for shard in self.shards], dtype=np.int64)
+        ends = np.cumsum(sizes)
+        n_samples = int(ends[-1])
+        start = max(0, n_samples - self.buffer_size)
+        indices = np.sort(np.random.choice(n_samples - start, batch_size, replace=False) + start)
+        shard_ids = np.searchsorted(ends, indices, side='right')
+        offsets = indices - (ends - sizes)[shard_ids]
+        batch = {field: np.empty((batch_size,) + shape, dtype=dtype) for field, (shape, dtype) in SAMPLE_FIELDS.items()}
+        for shard_id in np.unique(shard_ids):
+            mask = shard_ids == shard_id
+            arrays = self._get_arrays(self.shards[shard_id]['name'])
+            for field in SAMPLE_FIELDS:
+                batch[field][mask] = arrays[field][offsets[mask]]
+        return decode_samples(batch)
@@ -0,0 +1,229 @@
+#root parallel MCTS: several processes search the same root independently, their root visits are merged
+import os
+import multiprocessing as mp
+import tempfile
+import traceback
+import numpy as np
+import torch
+from bitboard_rule_for_mcts import BitboardGamePosition
+from config import CONFIG
+from mcts import MonteCarloTreeSearch, softmax, get_move_id
+from net import PolicyValueNet
+
+#loop of a worker process, it keeps the model, its own game position and its search tree between moves
+#commands: ('search', None), ('moves', list of move ids), ('position', game position), ('reset_tree', None),
+#('load_model', model file), ('close', None)
+#the worker answers the loading of its model and every command but close with ('ok', result) or ('error', traceback)
+def root_parallel_worker(conn, model_file, seed, c_puct, n_playout, n_threads, noise_weight):
+    torch.set_num_threads(n_threads)
+    try:
+        policy_value_net = PolicyValueNet(model_file=model_file)
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+        conn.close()
+        return
+    conn.send(('ok', None))
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    mcts = MonteCarloTreeSearch(policy_value_net.policy_value_fn, c_puct, n_playout,
+                                batch_policy_value_fn=policy_value_net.policy_value_fn_batch, search_threads=1,
+                                eval_cache=policy_value_net.eval_cache)
+    gp = BitboardGamePosition()
+    noised_root = None
+    while True:
+        command, arg = conn.recv()
+        try:
+            if command == 'search':
+                #the workers only differ by the noise added to the priors of their root
+                n_done = 0
+                if mcts._root.is_leaf():
+                    #expand the root first so that its priors get the noise, this playout counts in the budget
+                    mcts._playout(gp)
+                    n_done = 1
+                if mcts._root is not noised_root and not mcts._root.is_leaf():
+                    mcts._root.add_dirichlet_noise(noise_weight, CONFIG['dirichlet'])
+                    noised_root = mcts._root
+                n_done = mcts.run_playouts(gp, n_done)
+                child_proven = mcts._root.get_child_proven()
+                winning_moves = [act for act, result in child_proven if result == 1]
+                losing_moves = [act for act, result in child_proven if result == -1]
+                conn.send(('ok', (mcts._root.get_child_visits(), n_done, winning_moves, losing_moves)))
+            elif command == 'moves':
+                for move in arg:
+                    gp.make_move_by_id(move)
+                    mcts.update_with_move(move)
+                mcts.limit_tree_size()
+                gp.get_legal_moves()
+                conn.send(('ok', None))
+            elif command == 'position':
+                gp = arg
+                gp.get_legal_moves()
+                mcts.update_with_move(-1)
+                conn.send(('ok', None))
+            elif command == 'reset_tree':
+                mcts.update_with_move(-1)
+                conn.send(('ok', None))
+            elif command == 'load_model':
+                try:
+                    policy_value_net.load_model(arg)
+                except FileNotFoundError:
+                    print('Model file {} not found, the root parallel worker keeps its model'.format(arg))
+                mcts.update_with_move(-1)    #the tree was evaluated by the old model
+                conn.send(('ok', None))
+            elif command == 'close':
+                conn.close()
+                return
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+
+#AI player whose search runs in n_workers processes, used like MCTSPlayer
+class RootParallelMCTSPlayer(object):
+    def __init__(self, model_file=None, c_puct=5, n_playout=2000, is_selfplay=0, n_workers=None, seed=None):
+        self._is_selfplay = is_selfplay
+        self.agent = "AI"
+        n_workers = CONFIG['root_parallel_workers'] if n_workers is None else n_workers
+        seed = np.random.randint(2 ** 31) if seed is None else seed
+        n_threads = max(1, (os.cpu_count() or 1) // n_workers)
+        #the playouts of a move are shared by the workers
+        n_worker_playout = -(-n_playout // n_workers)
+        self._initial_model_file = None
+        if model_file is None or not os.path.exists(model_file):
+            #no checkpoint yet: the workers load one initial model saved here, so they all start from the same weights
+            fd, self._initial_model_file = tempfile.mkstemp(suffix='.pkl')
+            os.close(fd)
+            PolicyValueNet().save_model(self._initial_model_file)
+            print('Model file {} not found, the root parallel workers start from an initial model until the trainer saves its checkpoint'.format(model_file))
+            model_file = self._initial_model_file
+        ctx = mp.get_context('spawn')
+        self._conns = []
+        self._processes = []
+        for i in range(n_workers):
+            conn, worker_conn = ctx.Pipe()
+            process = ctx.Process(target=root_parallel_worker, daemon=True,
+                                  args=(worker_conn, model_file, seed + i, c_puct, n_worker_playout, n_threads, CONFIG['root_parallel_noise']))
+            process.start()
+            worker_conn.close()    #the pipe is closed if the worker stops
+            self._conns.append(conn)
+            self._processes.append(process)
+        try:
+            self._receive_all()    #the workers have loaded the model
+        except:
+            self.close()
+            raise
+        self._n_playout = n_worker_playout * n_workers
+        #the workers have the position reached after synced_len moves of the game
+        self._synced_len = None
+        self._synced_key = None
+        self.n_playouts_done = 0
+        self.n_playouts_saved = 0
+
+    def set_player_ind(self, p):
+        self.player = p
+
+    #total playouts done and saved by the searches of the player
+    def get_playout_stats(self):
+        return self.n_playouts_done, self.n_playouts_saved
+
+    #reset the searching trees
+    def reset_player(self):
+        self._call_all(('reset_tree', None))
+
+    def __str__(self):
+        return 'Root parallel MCTS {}'.format(self.player)
+
+    def _send_all(self, message):
+        for conn in self._conns:
+            conn.send(message)
+
+    def _receive_all(self):
+        #read the answer of every worker before raising an error, so that no answer is left in a pipe
+        answers = []
+        for conn in self._conns:
+            try:
+                answers.append(conn.recv())
+            except EOFError:
+                answers.append(('error', 'the worker process stopped'))
+        for status, result in answers:
+            if status == 'error':
+                raise RuntimeError('root parallel worker failed:\n' + result)
+        return [result for status, result in answers]
+
+    def _call_all(self, message):
+        self._send_all(message)
+        return self._receive_all()
+
+    def _sync(self, gp):
+        #ship only the moves played since the last search if the game goes on, otherwise the whole position
+        n_moves = len(gp.move_history)
+        synced_len, self._synced_len = self._synced_len, None    #synced again from the whole position if this fails
+        if synced_len is not None and n_moves >= synced_len and gp.zobrist_key_log[synced_len] == self._synced_key:
+            if n_moves > synced_len:
+                self._call_all(('moves', [get_move_id(move) for move in gp.move_history[synced_len:]]))
+        else:
+            self._call_all(('position', gp))
+        self._synced_len = n_moves
+        self._synced_key = gp.zobrist_key
+
+    def load_model(self, model_file):
+        self._call_all(('load_model', model_file))
+
+    def close(self):
+        for conn in self._conns:
+            try:
+                conn.send(('close', None))
+            except (BrokenPipeError, OSError):
+                pass    #the worker already stopped
+        for process in self._processes:
+            process.join()
+        if self._initial_model_file is not None:
+            os.remove(self._initial_model_file)
+            self._initial_model_file = None
+
+    #get action, the visits of the roots of all workers are added up
+    def get_action(self, gp, temp=1e-3, return_prob=0):
+        legal_moves_id_list = gp.get_legal_moves(return_ids=True)
+        if len(legal_moves_id_list) == 1 and CONFIG['early_stop']:
+            #forced move, no search needed, the workers get the move with the next search
+            acts = np.array(legal_moves_id_list)
+            probs = np.array([1.0])
+            self.n_playouts_saved += self._n_playout
+        else:
+            self._sync(gp)
+            visits = np.zeros(1968)
+            n_done = 0
+            winning_moves = []
+            losing_moves = set()
+            for act_visits, n_worker_done, worker_winning_moves, worker_losing_moves in self._call_all(('search', None)):
+                for act, n_visits in act_visits:
+                    visits[act] += n_visits
+                n_done += n_worker_done
+                winning_moves += worker_winning_moves
+                losing_moves.update(worker_losing_moves)
+            self.n_playouts_done += n_done
+            self.n_playouts_saved += self._n_playout - n_done
+            if len(winning_moves) > 0:
+                #a move proven to win by any worker is played at once
+                acts = np.array(winning_moves[:1])
+                probs = np.array([1.0])
+            else:
+                acts = np.flatnonzero(visits)
+                #a move proven to lose by any worker is not played, unless all the moves lose
+                not_losing = np.array([act not in losing_moves for act in acts], dtype=bool)
+                if np.any(not_losing):
+                    acts = acts[not_losing]
+                probs = softmax(1.0 / temp * np.log(visits[acts] + 1e-10))
+        move_probs = np.zeros(1968)
+        move_probs[acts] = probs
+        if self._is_selfplay:
+            #adding Diriclet noise for self playing
+            move = np.random.choice(
+                acts,
+                p=0.75*probs + 0.25*np.random.dirichlet(CONFIG['dirichlet'] * np.ones(len(probs)))
+            )
+        else:
+            move = np.random.choice(acts, p=probs)
+        #the workers reuse their trees after the moves are shipped with the next search
+        if return_prob:
+            return move, move_probs
+        else:
+            return move
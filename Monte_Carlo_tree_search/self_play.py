@@ -1,10 +1,27 @@
-import chess_rule_for_mcts as chess_rule
+from bitboard_rule_for_mcts import BitboardGamePosition
 import numpy as np
 import time
 
+def get_game_result(gp):
+    #return whether the game ends after the last move, and the winner (None for a draw or a game going on)
+    if gp.stalemate or gp.fifty_moves_draw or gp.three_rep_draw:
+        return True, None
+    elif gp.checkmate:
+        return True, True if (not gp.white_turn) else False
+    return False, None
+
+def get_winner_z(cur_players, winner_is_white):
+    #win and loss information via the prespective of cur players
+    winner_z = np.zeros(len(cur_players))
+    if winner_is_white is not None:
+        winner_z[np.array(cur_players) == winner_is_white] = 1.0
+        winner_z[np.array(cur_players) != winner_is_white] = -1.0
+    return winner_z
+
 def MCT_start_self_play(player, is_shown=False, temp=1e-3):
-    gp = chess_rule.GamePosition()
+    gp = BitboardGamePosition()
     position_log, mcts_probs, cur_players = [], [], []
+    start_playouts_done, start_playouts_saved = player.get_playout_stats()
     #start self playing
     _count = 0
     while True:
@@ -25,22 +42,17 @@ def MCT_start_self_play(player, is_shown=False, temp=1e-3):
         gp.get_legal_moves()
 
         #check whether the game ends
-        if gp.stalemate or gp.fifty_moves_draw or gp.three_rep_draw:
-            end = True
-            winner_is_white = None
-        elif gp.checkmate:
-            end = True
-            winner_is_white = True if (not gp.white_turn) else False
-        else:
-            end = False
-            winner_is_white = None
+        end, winner_is_white = get_game_result(gp)
 
         if end:
             #save win and loss information via the prespective of cur players
-            winner_z = np.zeros(len(cur_players))
-            if winner_is_white is not None:
-                winner_z[np.array(cur_players) == winner_is_white] = 1.0
-                winner_z[np.array(cur_players) != winner_is_white] = -1.0
+            winner_z = get_winner_z(cur_players, winner_is_white)
+            #report the playouts spared by forced moves and early stops
+            playouts_done, playouts_saved = player.get_playout_stats()
+            playouts_done -= start_playouts_done
+            playouts_saved -= start_playouts_saved
+            print('Playouts done: {}, saved: {} ({:.1%})'.format(
+                playouts_done, playouts_saved, playouts_saved / max(1, playouts_done + playouts_saved)))
             #reset Monte-Carlo root node
             player.reset_player()
             if is_shown:
@@ -0,0 +1,101 @@
+#supervisor of the self playing processes: it starts them, restarts the ones that stop,
+#and is the only writer of the data buffer, the games of all processes come to it through a queue
+import os
+import time
+import queue
+import random
+import multiprocessing as mp
+import numpy as np
+import torch
+from config import CONFIG
+from collect import CollectPipeline
+
+#seconds between two reports of the collecting speed
+REPORT_INTERVAL = 60
+#minimum seconds between the start and the restart of a worker, so that a worker failing at once is not restarted in a loop
+RESTART_INTERVAL = 10
+
+#loop of a self playing process, every finished game is sent to the supervisor
+def self_play_worker(worker_id, seed, n_threads, game_queue):
+    torch.set_num_threads(n_threads)
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    pipeline = CollectPipeline()
+    while True:
+        play_data = pipeline.play_game()
+        game_queue.put((worker_id, play_data))
+
+class CollectSupervisor(object):
+    def __init__(self, n_workers=None):
+        n_workers = CONFIG['self_play_workers'] if n_workers is None else n_workers
+        self.n_workers = n_workers if n_workers is not None else (os.cpu_count() or 1)
+        self._n_threads = max(1, (os.cpu_count() or 1) // self.n_workers)
+        #the workers may start processes themselves (root parallel search), so they are not daemons
+        self._ctx = mp.get_context('spawn')
+        self._queue = self._ctx.Queue()
+        self._processes = [None] * self.n_workers
+        self._start_times = [None] * self.n_workers
+        self.writer = CollectPipeline()
+        self.n_games = 0
+        self.n_positions = 0
+        self.n_restarts = 0
+        self.start_time = None
+
+    def _start_worker(self, worker_id):
+        process = self._ctx.Process(target=self_play_worker,
+                                    args=(worker_id, np.random.randint(2 ** 31), self._n_threads, self._queue))
+        process.start()
+        self._processes[worker_id] = process
+        self._start_times[worker_id] = time.time()
+
+    def _check_workers(self):
+        #restart the workers that stopped, e.g. after an exception or being killed
+        for worker_id, process in enumerate(self._processes):
+            if not process.is_alive() and time.time() - self._start_times[worker_id] >= RESTART_INTERVAL:
+                print('Self play worker {} stopped with exit code {}, restarting it'.format(worker_id, process.exitcode))
+                process.join()
+                self.n_restarts += 1
+                self._start_worker(worker_id)
+
+    def get_stats(self):
+        elapsed = max(time.time() - self.start_time, 1e-9)
+        return {'games': self.n_games, 'positions': self.n_positions, 'games_per_hour': self.n_games * 3600 / elapsed,
+                'positions_per_s': self.n_positions / elapsed, 'restarts': self.n_restarts}
+
+    def report(self):
+        stats = self.get_stats()
+        print('games: {}, positions: {}, games/hour: {:.1f}, positions/s: {:.2f}, restarts: {}'.format(
+            stats['games'], stats['positions'], stats['games_per_hour'], stats['positions_per_s'], stats['restarts']))
+
+    def run(self):
+        self.start_time = time.time()
+        last_report = time.time()
+        for worker_id in range(self.n_workers):
+            self._start_worker(worker_id)
+        try:
+            while True:
+                try:
+                    worker_id, play_data = self._queue.get(timeout=5)
+                except queue.Empty:
+                    pass
+                else:
+                    self.writer.save_play_data(play_data)
+                    self.n_games += 1
+                    self.n_positions += len(play_data['winners'])
+                    print('game of worker {}, episode_len: {}, iters: {}'.format(worker_id, len(play_data['winners']), self.writer.iters))
+                self._check_workers()
+                if time.time() - last_report > REPORT_INTERVAL:
+                    last_report = time.time()
+                    self.report()
+        except KeyboardInterrupt:
+            print('\n\rquit')
+        finally:
+            for process in self._processes:
+                if process is not None and process.is_alive():
+                    process.terminate()
+                    process.join()
+            self.report()
+
+if __name__ == '__main__':
+    CollectSupervisor().run()
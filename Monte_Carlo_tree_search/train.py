@@ -1,20 +1,20 @@
 import random
-from collections import deque
+import os
 
 import numpy as np
-import pickle
 import time
 
 from config import CONFIG
-import chess_rule_for_mcts as chess_rule
+from bitboard_rule_for_mcts import BitboardGamePosition
 from mcts import MCTSPlayer
 from net import PolicyValueNet
+from replay_buffer import ReplayBuffer
 
 #define the training process
 class TrainPipeline:
     def __init__(self, init_model=None):
         #train params
-        self.gp = chess_rule.GamePosition()
+        self.gp = BitboardGamePosition()
         self.n_playout = CONFIG['play_out']
         self.c_puct = CONFIG['c_puct']
         self.learn_rate = 1e-3
@@ -28,7 +28,7 @@ class TrainPipeline:
         self.best_win_ratio = 0.0
         self.pure_mcts_playout_num = 500
         self.buffer_size = maxlen=CONFIG['buffer_size']
-        self.data_buffer = deque(maxlen=self.buffer_size)
+        self.replay_buffer = ReplayBuffer(buffer_size=self.buffer_size)
         if init_model:
             try:
                 self.policy_value_net = PolicyValueNet(model_file=init_model)
@@ -39,18 +39,13 @@ class TrainPipeline:
         else:
             print('Training from origin.')
             self.policy_value_net = PolicyValueNet()
+        if not os.path.exists(CONFIG['pytorch_model_path']):
+            #the collectors start from the initial checkpoint of the trainer
+            self.policy_value_net.save_model(CONFIG['pytorch_model_path'])
 
     def policy_updata(self):
-        mini_batch = random.sample(self.data_buffer, self.batch_size)
-        # print(mini_batch[0][1],mini_batch[1][1])
-        state_batch = [data[0] for data in mini_batch]
-        state_batch = np.array(state_batch).astype('float32')
-
-        mcts_probs_batch = [data[1] for data in mini_batch]
-        mcts_probs_batch = np.array(mcts_probs_batch).astype('float32')
-
-        winner_batch = [data[2] for data in mini_batch]
-        winner_batch = np.array(winner_batch).astype('float32')
+        #only the sampled rows are read from the replay buffer
+        state_batch, mcts_probs_batch, winner_batch = self.replay_buffer.sample(self.batch_size)
 
         #old policy and value
         old_probs, old_v = self.policy_value_net.policy_value(state_batch)
@@ -102,19 +97,11 @@ class TrainPipeline:
         #start training
         try:
             for i in range(self.game_batch_num):
-                while True:
-                    try:
-                        with open(CONFIG['train_data_buffer_path'], 'rb') as data_dict:
-                            data_file = pickle.load(data_dict)
-                            self.data_buffer = data_file['data_buffer']
-                            self.iters = data_file['iters']
-                            del data_file
-                        print('已载入数据')
-                        break
-                    except:
-                        time.sleep(30)
+                #see the games added by the collectors since the last step
+                self.replay_buffer.reload()
+                self.iters = self.replay_buffer.iters
                 print('step i {}: '.format(self.iters))
-                if len(self.data_buffer) > self.batch_size:
+                if len(self.replay_buffer) > self.batch_size:
                     loss, entropy = self.policy_updata()
                     #save model
                     self.policy_value_net.save_model(CONFIG['pytorch_model_path'])
@@ -0,0 +1,87 @@
+from advaced_engines.transposition_table import move_to_key
+
+MAX_PLY = 128
+
+#piece values used to rank the captures (most valuable victim, least valuable attacker)
+MVV_LVA_VALUES = {'P': 1, 'N': 3, 'B': 3, 'R': 5, 'Q': 9, 'K': 10}
+
+#score bands, the higher the earlier a move is searched
+PV_MOVE_SCORE = 4000000
+HASH_MOVE_SCORE = 3000000
+CAPTURE_SCORE = 2000000
+PROMOTION_SCORE = 1500000
+KILLER_SCORES = [1000000, 900000]
+MAX_HISTORY_SCORE = 800000
+
+# ranks the moves of a node: hash move, captures by MVV-LVA, promotions, killer moves of the ply, then the history table
+class MoveOrdering():
+    def __init__(self):
+        self.killer_moves = [[None, None] for ply in range(MAX_PLY)]
+        self.history = {} #(piece, end_row, end_col) -> score of the quiet moves that caused cutoffs
+        #statistics of the nodes whose moves were searched
+        self.interior_nodes = 0
+        self.cutoff_nodes = 0
+        self.first_move_cutoffs = 0
+        self.moves_searched = 0
+
+    # forget the killers, and age the history so older searches count less
+    def new_search(self):
+        self.killer_moves = [[None, None] for ply in range(MAX_PLY)]
+        for key in self.history:
+            self.history[key] //= 2
+        self.interior_nodes = 0
+        self.cutoff_nodes = 0
+        self.first_move_cutoffs = 0
+        self.moves_searched = 0
+
+    def score_move(self, move, ply, hash_move, pv_move):
+        key = move_to_key(move)
+        if key == pv_move:
+            return PV_MOVE_SCORE
+        if key == hash_move:
+            return HASH_MOVE_SCORE
+        if move.is_cap:
+            return CAPTURE_SCORE + 10 * MVV_LVA_VALUES[move.piece_caped[1]] - MVV_LVA_VALUES[move.piece_move[1]]
+        if move.is_promotion:
+            return PROMOTION_SCORE + MVV_LVA_VALUES[move.promotion_piece[-1]] if move.promotion_piece != '?' else PROMOTION_SCORE
+        if ply < MAX_PLY:
+            killers = self.killer_moves[ply]
+            if key == killers[0]:
+                return KILLER_SCORES[0]
+            if key == killers[1]:
+                return KILLER_SCORES[1]
+        return min(self.history.get((move.piece_move, move.end_row, move.end_col), 0), MAX_HISTORY_SCORE)
+
+    # sort the moves in place, the sort is stable so equally ranked moves keep their order
+    def order_moves(self, legal_moves, ply, hash_move=None, pv_move=None):
+        legal_moves.sort(key=lambda move: self.score_move(move, ply, hash_move, pv_move), reverse=True)
+
+    # record the search result of a node, the move that caused a cutoff (if any) and how many moves were tried
+    def update(self, move, ply, depth, moves_tried, is_cutoff):
+        self.interior_nodes += 1
+        self.moves_searched += moves_tried
+        if not is_cutoff:
+            return
+        self.cutoff_nodes += 1
+        if moves_tried == 1:
+            self.first_move_cutoffs += 1
+        if move.is_cap or move.is_promotion:
+            return
+        key = move_to_key(move)
+        if ply < MAX_PLY and self.killer_moves[ply][0] != key:
+            self.killer_moves[ply][1] = self.killer_moves[ply][0]
+            self.killer_moves[ply][0] = key
+        history_key = (move.piece_move, move.end_row, move.end_col)
+        self.history[history_key] = self.history.get(history_key, 0) + depth * depth
+
+    # share of the cutoffs made by the first move, close to 1 means the ordering is good
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoff_nodes if self.cutoff_nodes > 0 else 0.0
+
+    def cutoff_rate(self):
+        return self.cutoff_nodes / self.interior_nodes if self.interior_nodes > 0 else 0.0
+
+    def get_stats(self):
+        return {'interior_nodes': self.interior_nodes, 'cutoff_nodes': self.cutoff_nodes,
+                'cutoff_rate': self.cutoff_rate(), 'first_move_cutoff_rate': self.first_move_cutoff_rate(),
+                'moves_per_node': self.moves_searched / self.interior_nodes if self.interior_nodes > 0 else 0.0}
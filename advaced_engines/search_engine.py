@@ -0,0 +1,251 @@
+import random
+import time
+from AI_standard_setting import ai_default_setting
+from advaced_engines.transposition_table import TranspositionTable, move_to_key, EXACT, LOWER_BOUND, UPPER_BOUND
+from advaced_engines.move_ordering import MoveOrdering
+
+#raised inside the search when the time or node limit is reached
+class SearchAborted(Exception):
+    pass
+
+# limits of one search, None means no limit (the depth defaults to ai_default_setting.DEPTH)
+class SearchLimits():
+    def __init__(self, depth=None, time_limit=None, node_limit=None):
+        self.depth = depth
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+
+# outcome of one search, the score is from the point of view of the side to move
+class SearchResult():
+    def __init__(self, move, score, principal_variation, depth, nodes, elapsed, stats):
+        self.move = move
+        self.score = score
+        self.principal_variation = principal_variation #list of moves, starting with the best one
+        self.depth = depth #depth of the last completed iteration
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.stats = stats
+
+    def __str__(self):
+        return 'depth {} score {:.2f} nodes {} pv {}'.format(self.depth, self.score, self.nodes,
+                                                             ' '.join(str(move) for move in self.principal_variation))
+
+# negamax alpha-beta search with its own configuration, transposition table, move ordering tables and statistics,
+# several engines can search at the same time as long as each one gets its own game position
+class SearchEngine():
+    def __init__(self, tt_size_mb=None, tt_replacement=None, quiescence=None, delta_margin=None):
+        ai_default_setting.install_score_tables()
+        self.transposition_table = TranspositionTable(ai_default_setting.TT_SIZE_MB if tt_size_mb is None else tt_size_mb,
+                                                      ai_default_setting.TT_REPLACEMENT if tt_replacement is None else tt_replacement)
+        self.move_ordering = MoveOrdering()
+        self.quiescence = ai_default_setting.QUIESCENCE if quiescence is None else quiescence
+        self.delta_margin = ai_default_setting.DELTA_MARGIN if delta_margin is None else delta_margin
+        #state of the running search
+        self.search_depth = 0 #depth of the current iteration
+        self.search_start_ply = 0 #length of the move history at the root
+        self.principal_variation = [] #best line of the last completed iteration, as move keys
+        self.root_move = None
+        self.root_score = 0
+        self.nodes_searched = 0
+        self.max_nodes = None
+        self.deadline = None
+
+    # forget everything learned in previous searches (e.g. for a new game)
+    def reset(self):
+        self.transposition_table.clear()
+        self.move_ordering = MoveOrdering()
+
+    #iterative deepening: search depth 1, 2, ... until the depth or another limit is reached
+    #the move of the last completed iteration is returned, an unfinished iteration is thrown away
+    def search(self, gp, limits=None, legal_moves=None):
+        limits = SearchLimits() if limits is None else limits
+        max_depth = ai_default_setting.DEPTH if limits.depth is None else limits.depth
+        start_time = time.perf_counter()
+        if gp.score_log is None and len(gp.move_history) == 0:
+            gp.init_scores() #the position was set before the score tables were installed, nothing to undo yet
+        if legal_moves is None:
+            legal_moves = gp.get_legal_moves()
+        if len(legal_moves) == 0:
+            return SearchResult(None, ai_default_setting.evaluate_position(gp, legal_moves) * (1 if gp.white_turn else -1), [], 0, 0, 0.0, {})
+        random.shuffle(legal_moves) #equally ranked moves are tried in random order
+        self.transposition_table.new_search()
+        self.move_ordering.new_search()
+        self.search_start_ply = len(gp.move_history)
+        self.principal_variation = []
+        self.nodes_searched = 0
+        self.max_nodes = limits.node_limit
+        self.deadline = start_time + limits.time_limit if limits.time_limit is not None else None
+        best_move = None
+        best_score = 0
+        completed_depth = 0
+        for depth in range(1, max_depth + 1):
+            self.search_depth = depth
+            self.root_move = None
+            try:
+                score = self.Nega_max_alpha_beta_pruning_step(gp, legal_moves, depth, -(ai_default_setting.WIN + 1), (ai_default_setting.WIN + 1), 1 if gp.white_turn else -1)
+            except SearchAborted:
+                #take back the moves made by the unfinished iteration
+                while len(gp.move_history) > self.search_start_ply:
+                    gp.undo_move()
+                break
+            best_move = self.root_move
+            best_score = score
+            completed_depth = depth
+            self.principal_variation = self.get_principal_variation(gp, depth)
+        self.deadline = None
+        self.max_nodes = None
+        if best_move is None: #not even depth 1 was completed
+            best_move = self.root_move if self.root_move is not None else legal_moves[0]
+        principal_variation = self.get_principal_variation_moves(gp, self.principal_variation)
+        if len(principal_variation) == 0 or move_to_key(principal_variation[0]) != move_to_key(best_move):
+            principal_variation = [best_move]
+        stats = self.move_ordering.get_stats()
+        stats['tt_hit_rate'] = self.transposition_table.hit_rate()
+        return SearchResult(best_move, best_score, principal_variation, completed_depth, self.nodes_searched,
+                            time.perf_counter() - start_time, stats)
+
+    #follow the best moves stored in the transposition table from the current position
+    def get_principal_variation(self, gp, max_length):
+        line = []
+        for i in range(max_length):
+            entry = self.transposition_table.probe(gp.zobrist_key)
+            if entry is None or entry[3] is None:
+                break
+            move = find_move(gp.get_legal_moves(), entry[3])
+            if move is None:
+                break
+            gp.make_move(move)
+            line.append(entry[3])
+        for i in range(len(line)):
+            gp.undo_move()
+        return line
+
+    #turn the move keys of a line into moves of the game position
+    def get_principal_variation_moves(self, gp, line):
+        moves = []
+        for move_key in line:
+            move = find_move(gp.get_legal_moves(), move_key)
+            if move is None:
+                break
+            gp.make_move(move)
+            moves.append(move)
+        for i in range(len(moves)):
+            gp.undo_move()
+        return moves
+
+    #the move of the previous principal variation at this node, if the path to it follows that variation
+    def get_pv_move(self, gp):
+        ply = len(gp.move_history) - self.search_start_ply
+        if ply >= len(self.principal_variation):
+            return None
+        for i in range(ply):
+            if move_to_key(gp.move_history[self.search_start_ply + i]) != self.principal_variation[i]:
+                return None
+        return self.principal_variation[ply]
+
+    def check_limits(self):
+        self.nodes_searched += 1
+        if (self.max_nodes is not None and self.nodes_searched > self.max_nodes) or (self.deadline is not None and time.perf_counter() > self.deadline):
+            raise SearchAborted()
+
+    #pruning when we reach a good enough eval alpha, or bad enough eval beta
+    def Nega_max_alpha_beta_pruning_step(self, gp, legal_moves, depth, alpha, beta, color_multiplier):
+        self.check_limits()
+        if len(legal_moves) == 0:
+            return color_multiplier * ai_default_setting.evaluate_position(gp, legal_moves)
+        if depth == 0:
+            if self.quiescence:
+                return self.quiescence_search(gp, alpha, beta, color_multiplier)
+            return color_multiplier * ai_default_setting.evaluate_position(gp, legal_moves)
+
+        #look up the position in the transposition table, the root is always searched to find the move
+        transposition_table = self.transposition_table
+        ply = len(gp.move_history) - self.search_start_ply
+        is_root = depth == self.search_depth and ply == 0
+        alpha_orig = alpha
+        hash_move = None
+        entry = transposition_table.probe(gp.zobrist_key)
+        if entry is not None:
+            entry_depth, bound, score, hash_move = entry
+            if entry_depth >= depth and not is_root:
+                if bound == EXACT:
+                    return score
+                elif bound == LOWER_BOUND:
+                    alpha = max(alpha, score)
+                elif bound == UPPER_BOUND:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+
+        #move ordering: previous principal variation, hash move, captures, promotions, killers, history
+        self.move_ordering.order_moves(legal_moves, ply, hash_move, self.get_pv_move(gp))
+
+        max_eval = -(ai_default_setting.WIN + 1)
+        best_move = None
+        moves_tried = 0
+        for move in legal_moves:
+            moves_tried += 1
+            gp.make_move(move)
+            next_moves = gp.get_legal_moves() #promotions are already expanded
+            cur_eval = -self.Nega_max_alpha_beta_pruning_step(gp, next_moves, depth - 1, -beta, -alpha, -color_multiplier)
+            if cur_eval > max_eval:
+                max_eval = cur_eval
+                best_move = move
+                if is_root:
+                    self.root_move = move
+            gp.undo_move()
+            if max_eval > alpha: #pruning
+                alpha = max_eval
+            if alpha >= beta:
+                break
+        self.move_ordering.update(best_move, ply, depth, moves_tried, alpha >= beta)
+
+        if max_eval <= alpha_orig:
+            bound = UPPER_BOUND
+        elif max_eval >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        transposition_table.store(gp.zobrist_key, depth, bound, max_eval, move_to_key(best_move) if best_move is not None else None)
+        return max_eval
+
+    #search only captures and promotions (all moves when in check) until the position is quiet
+    def quiescence_search(self, gp, alpha, beta, color_multiplier):
+        self.check_limits()
+        in_check = gp.is_in_check()
+        if in_check:
+            moves = gp.get_legal_moves() #check evasions
+            if len(moves) == 0:
+                return color_multiplier * ai_default_setting.evaluate_position(gp, moves)
+            max_eval = -(ai_default_setting.WIN + 1)
+        else:
+            moves = gp.get_capture_moves()
+            #stand pat: the side to move does not have to capture
+            max_eval = color_multiplier * ai_default_setting.evaluate_position(gp, moves)
+            if max_eval >= beta:
+                return max_eval
+            if max_eval > alpha:
+                alpha = max_eval
+        self.move_ordering.order_moves(moves, len(gp.move_history) - self.search_start_ply)
+        stand_pat = max_eval
+        for move in moves:
+            #delta pruning: even winning the captured piece for free cannot raise alpha
+            if not in_check and not move.is_promotion:
+                if stand_pat + abs(ai_default_setting.Piece_to_Value[move.piece_caped]) + self.delta_margin <= alpha:
+                    continue
+            gp.make_move(move)
+            cur_eval = -self.quiescence_search(gp, -beta, -alpha, -color_multiplier)
+            gp.undo_move()
+            if cur_eval > max_eval:
+                max_eval = cur_eval
+            if max_eval > alpha:
+                alpha = max_eval
+            if alpha >= beta:
+                break
+        return max_eval
+
+def find_move(legal_moves, move_key):
+    for move in legal_moves:
+        if move_to_key(move) == move_key:
+            return move
+    return None
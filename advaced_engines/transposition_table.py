@@ -0,0 +1,66 @@
+import sys
+
+#bound types of the stored scores
+EXACT = 0
+LOWER_BOUND = 1 #the score is at least the stored one (fail high)
+UPPER_BOUND = 2 #the score is at most the stored one (fail low)
+
+#size of one entry: the slot in the list, the entry tuple, its zobrist key, its score (ints above 256 are not shared)
+#and the best move key tuple, the small ints and the promotion piece strings in the move key are shared
+ENTRY_BYTES = (8 + sys.getsizeof((0, 0, 0, 0, 0, 0)) + sys.getsizeof(2 ** 63) + sys.getsizeof(10 ** 6)
+               + sys.getsizeof((0, 0, 0, 0, '?')))
+
+# fixed-size hash table of searched positions, indexed by the zobrist key of the position
+class TranspositionTable():
+    def __init__(self, size_mb=64, replacement='depth'):
+        # replacement policy: 'depth' keeps the deeper entry unless it comes from an older search, 'always' overwrites
+        if replacement not in ('depth', 'always'):
+            raise ValueError('unknown replacement policy: ' + str(replacement))
+        self.replacement = replacement
+        self.size = max(1, int(size_mb * 1024 * 1024) // ENTRY_BYTES)
+        self.entries = [None] * self.size
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    # start a new search, entries of previous searches are kept but can be replaced first
+    def new_search(self):
+        self.generation += 1
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    # return (depth, bound, score, best_move) or None, best_move is (start_row, start_col, end_row, end_col, promotion_piece)
+    def probe(self, key):
+        self.probes += 1
+        entry = self.entries[key % self.size]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1], entry[2], entry[3], entry[4]
+        return None
+
+    def store(self, key, depth, bound, score, best_move):
+        index = key % self.size
+        entry = self.entries[index]
+        if self.replacement == 'depth' and entry is not None and entry[5] == self.generation and entry[0] != key and entry[1] > depth:
+            return
+        if best_move is None and entry is not None and entry[0] == key:
+            best_move = entry[4] #keep the known best move of the position
+        self.entries[index] = (key, depth, bound, score, best_move, self.generation)
+        self.stores += 1
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes > 0 else 0.0
+
+    # fraction of the slots in use
+    def usage(self):
+        return sum(1 for entry in self.entries if entry is not None) / self.size
+
+# key of a move to store in the table
+def move_to_key(move):
+    return (move.start_row, move.start_col, move.end_row, move.end_col, move.promotion_piece)
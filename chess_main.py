@@ -1,7 +1,9 @@
 import pygame as pg
 import game_setup.chess_rule as chess_rule
+import game_setup.bitboard_rule as bitboard_rule
 from retard_engines import random_moves, one_move_thinker
 from advaced_engines import simple_minimax
+from advaced_engines.search_engine import SearchEngine
 from AI_standard_setting import ai_default_setting
 
 BOARD_WIDTH = BOARD_HEIGHT = 1024
@@ -15,6 +17,7 @@ SOUND_EFFECT = {}
 GRAVITY = 2.5
 FRICTION = 0.01
 DRAG_POS = 0.33
+USE_BITBOARD_RULES = False   #the list rules stay the default of the game, compare both backends with game_setup/perft.py before switching
 
 
 #load images of pieces given style
@@ -34,6 +37,12 @@ def load_sound_effects():
 
 from chess_physical_pieces import PhysicalPiece
 
+#setup a new game with the selected rules backend, both share the same GamePosition interface
+def new_game_position():
+    if USE_BITBOARD_RULES:
+        return bitboard_rule.BitboardGamePosition()
+    return chess_rule.GamePosition()
+
 # main game loop
 def main():
     pg.init()
@@ -44,8 +53,9 @@ def main():
     white_is_human = True
     black_is_human = False
 
-    #setup the game
-    gp = chess_rule.GamePosition()
+    #setup the game, the engine of the ai is kept for the whole game
+    engine = SearchEngine()
+    gp = new_game_position()
     legal_moves = gp.get_legal_moves()
     move_made = False
     click_animation = False
@@ -124,7 +134,8 @@ def main():
                     drag_animation = False
                     game_over = False
                 if e.key == pg.K_r: #reset the game when 'r' is pressed
-                    gp = chess_rule.GamePosition()
+                    engine = SearchEngine()
+                    gp = new_game_position()
                     legal_moves = gp.get_legal_moves()
                     cur_sq = ()
                     clicks = []
@@ -139,7 +150,7 @@ def main():
             if gp.white_turn:
                 AI_move = one_move_thinker.one_move_thinker_find(gp, legal_moves)
             else:
-                AI_move = simple_minimax.Nega_max_find_move(gp, legal_moves)
+                AI_move = simple_minimax.Nega_max_find_move(gp, legal_moves, engine)
 
             if AI_move != None:
                 AI_move.check_rep(legal_moves)
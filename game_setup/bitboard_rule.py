@@ -0,0 +1,357 @@
+from game_setup.chess_rule import GamePosition, Move, move_to_id
+
+# a bitboard is a 64-bit int, bit (8 * r + c) stands for the square position[r][c]
+FULL_BOARD = (1 << 64) - 1
+SQ_TO_ROW_COL = [(sq // 8, sq % 8) for sq in range(64)]
+
+#rook directions first, then bishop directions; a positive step means the square index grows along the ray
+DIRECTIONS = [(-1,0), (0,-1), (1,0), (0,1), (-1,-1), (-1,1), (1,-1), (1,1)]
+ROOK_POSITIVE_DIRS, ROOK_NEGATIVE_DIRS = [2, 3], [0, 1]
+BISHOP_POSITIVE_DIRS, BISHOP_NEGATIVE_DIRS = [6, 7], [4, 5]
+
+#precompute the attack tables
+def get_attack_tables():
+    rays = [[0] * 64 for d in range(8)]
+    between = [[0] * 64 for sq in range(64)]
+    knight_attacks = [0] * 64
+    king_attacks = [0] * 64
+    pawn_attacks = {'w': [0] * 64, 'b': [0] * 64} #squares attacked by a pawn of the given color standing on sq
+    for sq in range(64):
+        r, c = SQ_TO_ROW_COL[sq]
+        for d in range(8):
+            dr, dc = DIRECTIONS[d]
+            squares_passed = 0
+            for i in range(1, 8):
+                end_row, end_col = r + dr * i, c + dc * i
+                if not (0 <= end_row <= 7 and 0 <= end_col <= 7):
+                    break
+                end_sq = end_row * 8 + end_col
+                rays[d][sq] |= 1 << end_sq
+                between[sq][end_sq] = squares_passed
+                squares_passed |= 1 << end_sq
+        for dr, dc in [(1,2), (1,-2), (-1,2), (-1,-2), (2,1), (2,-1), (-2,1), (-2,-1)]:
+            if 0 <= r + dr <= 7 and 0 <= c + dc <= 7:
+                knight_attacks[sq] |= 1 << ((r + dr) * 8 + c + dc)
+        for dr in [-1, 0, 1]:
+            for dc in [-1, 0, 1]:
+                if (dr != 0 or dc != 0) and 0 <= r + dr <= 7 and 0 <= c + dc <= 7:
+                    king_attacks[sq] |= 1 << ((r + dr) * 8 + c + dc)
+        for dc in [-1, 1]:
+            if 0 <= c + dc <= 7:
+                if r > 0:
+                    pawn_attacks['w'][sq] |= 1 << ((r - 1) * 8 + c + dc)
+                if r < 7:
+                    pawn_attacks['b'][sq] |= 1 << ((r + 1) * 8 + c + dc)
+    return rays, between, knight_attacks, king_attacks, pawn_attacks
+
+RAYS, BETWEEN, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS = get_attack_tables()
+
+def sliding_attacks(sq, occupied, positive_dirs, negative_dirs):
+    attacks = 0
+    for d in positive_dirs:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= RAYS[d][(blockers & -blockers).bit_length() - 1]
+        attacks |= ray
+    for d in negative_dirs:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= RAYS[d][blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+#for every square, map each occupancy of the relevant squares (the edge squares never block) to the attacked squares
+def get_sliding_attack_tables(positive_dirs, negative_dirs):
+    masks = [0] * 64
+    tables = [{} for sq in range(64)]
+    for sq in range(64):
+        for d in positive_dirs:
+            ray = RAYS[d][sq]
+            masks[sq] |= ray & ~(1 << (ray.bit_length() - 1)) if ray else 0
+        for d in negative_dirs:
+            ray = RAYS[d][sq]
+            masks[sq] |= ray & ~(ray & -ray) if ray else 0
+        subset = 0
+        while True: # walk through all subsets of the mask
+            tables[sq][subset] = sliding_attacks(sq, subset, positive_dirs, negative_dirs)
+            subset = (subset - masks[sq]) & masks[sq]
+            if subset == 0:
+                break
+    return masks, tables
+
+ROOK_MASKS, ROOK_TABLES = get_sliding_attack_tables(ROOK_POSITIVE_DIRS, ROOK_NEGATIVE_DIRS)
+BISHOP_MASKS, BISHOP_TABLES = get_sliding_attack_tables(BISHOP_POSITIVE_DIRS, BISHOP_NEGATIVE_DIRS)
+
+# moves are generated as ints: start square | end square << 6 | kind << 12
+KIND_NORMAL, KIND_EN_PASSANT, KIND_CASTLE = 0, 1, 2
+PROMOTION_PIECES = ['Q', 'R', 'B', 'N'] # kind 3 + index, for the expanded promotions
+
+# map every encoded move to its id for the nn (see move_to_id), None for the encodings no legal move uses
+def get_encoded_move_ids():
+    encoded_move_ids = [None] * ((3 + len(PROMOTION_PIECES)) << 12)
+    for (start_row, start_col, end_row, end_col, promotion_piece), move_id in move_to_id.items():
+        encoded = (start_row * 8 + start_col) | ((end_row * 8 + end_col) << 6)
+        if promotion_piece == '?':
+            for kind in [KIND_NORMAL, KIND_EN_PASSANT, KIND_CASTLE]:
+                encoded_move_ids[encoded | (kind << 12)] = move_id
+        else:
+            encoded_move_ids[encoded | ((3 + PROMOTION_PIECES.index(promotion_piece)) << 12)] = move_id
+    return encoded_move_ids
+
+ENCODED_MOVE_IDS = get_encoded_move_ids()
+
+def rook_attacks(sq, occupied):
+    return ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]]
+
+def bishop_attacks(sq, occupied):
+    return BISHOP_TABLES[sq][occupied & BISHOP_MASKS[sq]]
+
+# same interface as GamePosition, but the legal moves are generated from bitboards
+class BitboardGamePosition(GamePosition):
+    def __init__(self):
+        super().__init__()
+        self.init_bitboards()
+
+    # build the bitboards from self.position
+    def init_bitboards(self):
+        self.bitboards = {color + piece: 0 for color in 'wb' for piece in 'KQRBNP'}
+        self.occupied = {'w': 0, 'b': 0}
+        for r in range(8):
+            for c in range(8):
+                piece = self.position[r][c]
+                if piece != '--':
+                    self.bitboards[piece] |= 1 << (r * 8 + c)
+                    self.occupied[piece[0]] |= 1 << (r * 8 + c)
+
+    def set_fen(self, fen):
+        super().set_fen(fen)
+        self.init_bitboards()
+
+    def make_move(self, move):
+        super().make_move(move)
+        self.toggle_move_bitboards(move)
+
+    def undo_move(self):
+        if len(self.move_history) != 0:
+            move = self.move_history[-1]
+            super().undo_move()
+            self.toggle_move_bitboards(move)
+
+    # xor the squares changed by the move, doing it twice restores the bitboards
+    def toggle_move_bitboards(self, move):
+        color = move.piece_move[0]
+        start_bit = 1 << (move.start_row * 8 + move.start_col)
+        end_bit = 1 << (move.end_row * 8 + move.end_col)
+        self.bitboards[move.piece_move] ^= start_bit
+        self.bitboards[move.promotion_piece if move.is_promotion else move.piece_move] ^= end_bit
+        self.occupied[color] ^= start_bit | end_bit
+        if move.is_cap:
+            cap_bit = 1 << ((move.start_row if move.is_en_passant else move.end_row) * 8 + move.end_col)
+            self.bitboards[move.piece_caped] ^= cap_bit
+            self.occupied[move.piece_caped[0]] ^= cap_bit
+        if move.is_castle:
+            if move.end_col - move.start_col == 2: # castle short
+                rook_bits = (1 << (move.end_row * 8 + 7)) | (1 << (move.end_row * 8 + 5))
+            else: # castle long
+                rook_bits = (1 << (move.end_row * 8)) | (1 << (move.end_row * 8 + 3))
+            self.bitboards[color + 'R'] ^= rook_bits
+            self.occupied[color] ^= rook_bits
+
+    # check whether sq is attacked by the pieces of the given color, with the given occupancy
+    def sq_attacked_by(self, sq, occupied, color):
+        bitboards = self.bitboards
+        if KNIGHT_ATTACKS[sq] & bitboards[color + 'N']:
+            return True
+        if PAWN_ATTACKS['b' if color == 'w' else 'w'][sq] & bitboards[color + 'P']:
+            return True
+        if KING_ATTACKS[sq] & bitboards[color + 'K']:
+            return True
+        queens = bitboards[color + 'Q']
+        rooks = bitboards[color + 'R'] | queens
+        if rooks and rook_attacks(sq, occupied) & rooks:
+            return True
+        bishops = bitboards[color + 'B'] | queens
+        if bishops and bishop_attacks(sq, occupied) & bishops:
+            return True
+        return False
+
+    def get_capture_moves(self):
+        return self.generate_legal_moves(captures_only = True)
+
+    def is_in_check(self):
+        if self.white_turn:
+            king_row, king_col = self.white_king_location
+            enemy_color = 'b'
+        else:
+            king_row, king_col = self.black_king_location
+            enemy_color = 'w'
+        return self.sq_attacked_by(king_row * 8 + king_col, self.occupied['w'] | self.occupied['b'], enemy_color)
+
+    # with captures_only, only captures and promotions are generated (the quiet moves are never built)
+    def generate_legal_moves(self, expand_promotions=True, captures_only=False):
+        position = self.position
+        ally_color = 'w' if self.white_turn else 'b'
+        moves = []
+        for encoded in self.generate_encoded_moves(expand_promotions, captures_only):
+            kind = encoded >> 12
+            start = SQ_TO_ROW_COL[encoded & 63]
+            end = SQ_TO_ROW_COL[(encoded >> 6) & 63]
+            if kind == KIND_NORMAL:
+                moves.append(Move(start, end, position))
+            elif kind == KIND_EN_PASSANT:
+                moves.append(Move(start, end, position, is_en_passant = True))
+            elif kind == KIND_CASTLE:
+                moves.append(Move(start, end, position, is_castle = True))
+            else:
+                moves.append(Move(start, end, position, promotion_piece = ally_color + PROMOTION_PIECES[kind - 3]))
+        return moves
+
+    # the ids of the legal moves straight from the encoded moves, no Move object is built
+    def generate_legal_move_ids(self):
+        return [ENCODED_MOVE_IDS[encoded] for encoded in self.generate_encoded_moves()]
+
+    # generate the legal moves as encoded ints, and set in_check, checks and pins like check_pins_and_checks
+    def generate_encoded_moves(self, expand_promotions=True, captures_only=False):
+        moves = []
+        bitboards = self.bitboards
+        if self.white_turn:
+            ally_color, enemy_color, front_step, start_row, promotion_row = 'w', 'b', -8, 6, 0
+            king_row, king_col = self.white_king_location
+        else:
+            ally_color, enemy_color, front_step, start_row, promotion_row = 'b', 'w', 8, 1, 7
+            king_row, king_col = self.black_king_location
+        king_sq = king_row * 8 + king_col
+        ally_occupied = self.occupied[ally_color]
+        enemy_occupied = self.occupied[enemy_color]
+        occupied = ally_occupied | enemy_occupied
+        enemy_queens = bitboards[enemy_color + 'Q']
+        enemy_rooks = bitboards[enemy_color + 'R'] | enemy_queens
+        enemy_bishops = bitboards[enemy_color + 'B'] | enemy_queens
+
+        checkers = (KNIGHT_ATTACKS[king_sq] & bitboards[enemy_color + 'N']) | (PAWN_ATTACKS[ally_color][king_sq] & bitboards[enemy_color + 'P']) | \
+                   (rook_attacks(king_sq, occupied) & enemy_rooks) | (bishop_attacks(king_sq, occupied) & enemy_bishops)
+        self.in_check = checkers != 0
+        # (row, col, row step, col step) of the checking pieces, the step goes from the king to the piece (the knight jump for a knight)
+        self.checks = []
+        remaining = checkers
+        while remaining:
+            low_bit = remaining & -remaining
+            remaining ^= low_bit
+            check_row, check_col = SQ_TO_ROW_COL[low_bit.bit_length() - 1]
+            if low_bit & bitboards[enemy_color + 'N']:
+                self.checks.append((check_row, check_col, check_row - king_row, check_col - king_col))
+            else:
+                self.checks.append((check_row, check_col, (check_row > king_row) - (check_row < king_row),
+                                    (check_col > king_col) - (check_col < king_col)))
+
+        # king moves, the king itself must not block the attacks on the squares behind it
+        occupied_without_king = occupied ^ (1 << king_sq)
+        targets = KING_ATTACKS[king_sq] & (enemy_occupied if captures_only else ~ally_occupied)
+        while targets:
+            low_bit = targets & -targets
+            targets ^= low_bit
+            end_sq = low_bit.bit_length() - 1
+            if not self.sq_attacked_by(end_sq, occupied_without_king, enemy_color):
+                moves.append(king_sq | (end_sq << 6))
+        if checkers & (checkers - 1): # double check, only the king can move
+            self.pins = []
+            return moves
+
+        # squares that resolve the check
+        if checkers:
+            checker_sq = checkers.bit_length() - 1
+            check_mask = BETWEEN[king_sq][checker_sq] | checkers
+        else:
+            check_mask = FULL_BOARD
+
+        # pinned pieces can only move between the king and the pinning piece
+        pin_masks = {}
+        self.pins = [] # (row, col, row step, col step) of the pinned pieces, the step goes from the king to the pinning piece
+        snipers = (rook_attacks(king_sq, enemy_occupied) & enemy_rooks) | (bishop_attacks(king_sq, enemy_occupied) & enemy_bishops)
+        while snipers:
+            low_bit = snipers & -snipers
+            snipers ^= low_bit
+            sniper_sq = low_bit.bit_length() - 1
+            blockers = BETWEEN[king_sq][sniper_sq] & occupied
+            if blockers and not (blockers & (blockers - 1)) and (blockers & ally_occupied):
+                pin_masks[blockers.bit_length() - 1] = BETWEEN[king_sq][sniper_sq] | low_bit
+                pin_row, pin_col = SQ_TO_ROW_COL[blockers.bit_length() - 1]
+                sniper_row, sniper_col = SQ_TO_ROW_COL[sniper_sq]
+                self.pins.append((pin_row, pin_col, (sniper_row > king_row) - (sniper_row < king_row),
+                                  (sniper_col > king_col) - (sniper_col < king_col)))
+
+        # knights, bishops, rooks and queens
+        not_ally = (enemy_occupied if captures_only else ~ally_occupied) & check_mask
+        for piece in 'NBRQ':
+            pieces = bitboards[ally_color + piece]
+            while pieces:
+                low_bit = pieces & -pieces
+                pieces ^= low_bit
+                sq = low_bit.bit_length() - 1
+                if piece == 'N':
+                    if sq in pin_masks:
+                        continue
+                    targets = KNIGHT_ATTACKS[sq]
+                elif piece == 'B':
+                    targets = bishop_attacks(sq, occupied)
+                elif piece == 'R':
+                    targets = rook_attacks(sq, occupied)
+                else:
+                    targets = rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
+                targets &= not_ally
+                if sq in pin_masks:
+                    targets &= pin_masks[sq]
+                while targets:
+                    low_bit = targets & -targets
+                    targets ^= low_bit
+                    moves.append(sq | ((low_bit.bit_length() - 1) << 6))
+
+        # pawns
+        en_passant_sq = -1
+        if self.en_passant_possible_sq != ():
+            en_passant_sq = self.en_passant_possible_sq[0] * 8 + self.en_passant_possible_sq[1]
+        pawns = bitboards[ally_color + 'P']
+        while pawns:
+            pawn_bit = pawns & -pawns
+            pawns ^= pawn_bit
+            sq = pawn_bit.bit_length() - 1
+            allowed = check_mask & pin_masks.get(sq, FULL_BOARD)
+            targets = 0
+            one_step = sq + front_step
+            if not (occupied >> one_step) & 1 and (not captures_only or one_step // 8 == promotion_row):
+                targets |= (1 << one_step)
+                if sq // 8 == start_row and not captures_only and not (occupied >> (one_step + front_step)) & 1:
+                    targets |= (1 << (one_step + front_step))
+            targets = (targets | (PAWN_ATTACKS[ally_color][sq] & enemy_occupied)) & allowed
+            while targets:
+                low_bit = targets & -targets
+                targets ^= low_bit
+                end_sq = low_bit.bit_length() - 1
+                if end_sq // 8 == promotion_row and expand_promotions:
+                    for kind in range(3, 3 + len(PROMOTION_PIECES)):
+                        moves.append(sq | (end_sq << 6) | (kind << 12))
+                else:
+                    moves.append(sq | (end_sq << 6))
+            if en_passant_sq >= 0 and (PAWN_ATTACKS[ally_color][sq] >> en_passant_sq) & 1:
+                # remove both pawns and check the king directly, this also covers the pins along the rank
+                caped_sq = en_passant_sq - front_step
+                occupied_after = occupied ^ pawn_bit ^ (1 << caped_sq) ^ (1 << en_passant_sq)
+                if not ((KNIGHT_ATTACKS[king_sq] & bitboards[enemy_color + 'N']) or
+                        (PAWN_ATTACKS[ally_color][king_sq] & bitboards[enemy_color + 'P'] & ~(1 << caped_sq)) or
+                        (rook_attacks(king_sq, occupied_after) & enemy_rooks) or
+                        (bishop_attacks(king_sq, occupied_after) & enemy_bishops)):
+                    moves.append(sq | (en_passant_sq << 6) | (KIND_EN_PASSANT << 12))
+
+        # castle
+        if not checkers and not captures_only:
+            if (ally_color == 'w' and self.current_castling_rights.wks) or (ally_color == 'b' and self.current_castling_rights.bks):
+                if not (occupied >> (king_sq + 1)) & 3 and not self.sq_attacked_by(king_sq + 1, occupied, enemy_color) and \
+                        not self.sq_attacked_by(king_sq + 2, occupied, enemy_color):
+                    moves.append(king_sq | ((king_sq + 2) << 6) | (KIND_CASTLE << 12))
+            if (ally_color == 'w' and self.current_castling_rights.wqs) or (ally_color == 'b' and self.current_castling_rights.bqs):
+                if not (occupied >> (king_sq - 3)) & 7 and not self.sq_attacked_by(king_sq - 1, occupied, enemy_color) and \
+                        not self.sq_attacked_by(king_sq - 2, occupied, enemy_color):
+                    moves.append(king_sq | ((king_sq - 2) << 6) | (KIND_CASTLE << 12))
+        return moves
@@ -1,4 +1,4 @@
-import copy
+import random
 import numpy as np
 
 #convert position to np.array and reversely
@@ -54,8 +54,34 @@ def get_move_to_id_map():
 
 move_to_id, id_to_move = get_move_to_id_map()
 
+#generate the random 64-bit keys for zobrist hashing (pieces on squares, side to move, castling rights, en-passant file)
+def get_zobrist_keys(seed=20240601):
+    rng = random.Random(seed)
+    piece_keys = {}
+    for piece in str_to_vector:
+        if piece != '--':
+            piece_keys[piece] = [[rng.getrandbits(64) for c in range(8)] for r in range(8)]
+    black_turn_key = rng.getrandbits(64)
+    castle_keys = [rng.getrandbits(64) for i in range(4)] #wks, bks, wqs, bqs
+    castle_state_keys = [] #one key for each of the 16 combinations of castling rights
+    for state in range(16):
+        key = 0
+        for i in range(4):
+            if state & (1 << i):
+                key ^= castle_keys[i]
+        castle_state_keys.append(key)
+    en_passant_keys = [rng.getrandbits(64) for c in range(8)]
+    return piece_keys, black_turn_key, castle_state_keys, en_passant_keys
+
+zobrist_piece_keys, zobrist_black_turn_key, zobrist_castle_keys, zobrist_en_passant_keys = get_zobrist_keys()
+
 # define the position of the current game, including the previous moves(or not)
 class GamePosition():
+    #piece values and piece-square values (white positive) whose totals are kept up to date by make_move/undo_move,
+    #installed by the evaluation with set_score_tables, without them (e.g. in the mcts) the scores are not tracked
+    material_values = None
+    positional_values = None
+
     def __init__(self):
         self.position = [
             ['bR', 'bN', 'bB', 'bQ', 'bK', 'bB', 'bN', 'bR'],
@@ -85,12 +111,20 @@ class GamePosition():
                                                self.current_castling_rights.wqs, self.current_castling_rights.bqs)]
         
         self.pawn_and_cap_move_counter = [0]
-        self.position_history=[copy.deepcopy(self.position)] 
         self.fifty_moves_draw = False
         self.three_rep_draw = False
 
+        #zobrist key of the current position and the number of times each key occured since the last pawn move or capture
+        self.zobrist_key = self.get_zobrist_key()
+        self.zobrist_key_log = [self.zobrist_key]
+        self.rep_counter = {self.zobrist_key: 1}
+        self.rep_counter_log = []
+        self.ply_offset = 0 #half moves played before the position the game started from
+        self.init_scores()
+
     # change the position using a given normal move(not castling, promotion or en-passant)
     def make_move(self, move):
+        prev_en_passant_key = self.get_en_passant_key(self.en_passant_possible_sq)
         self.position[move.start_row][move.start_col] = '--'
         self.position[move.end_row][move.end_col] = move.piece_move
         self.move_history.append(move)
@@ -136,8 +170,30 @@ class GamePosition():
         else:
             self.pawn_and_cap_move_counter.append(self.pawn_and_cap_move_counter[-1] + 1)
 
-        #update the three rep rule
-        self.position_history.append(copy.deepcopy(self.position))
+        #update the material and positional scores
+        if self.score_log is not None:
+            self.update_scores(move)
+
+        #update the zobrist key incrementally
+        key = self.zobrist_key ^ zobrist_black_turn_key
+        key ^= zobrist_piece_keys[move.piece_move][move.start_row][move.start_col]
+        key ^= zobrist_piece_keys[self.position[move.end_row][move.end_col]][move.end_row][move.end_col]
+        if move.is_cap:
+            key ^= zobrist_piece_keys[move.piece_caped][move.start_row if move.is_en_passant else move.end_row][move.end_col]
+        if move.is_castle:
+            rook = self.position[move.end_row][move.end_col - 1] if move.end_col - move.start_col == 2 else self.position[move.end_row][move.end_col + 1]
+            rook_start_col, rook_end_col = (7, 5) if move.end_col - move.start_col == 2 else (0, 3)
+            key ^= zobrist_piece_keys[rook][move.end_row][rook_start_col] ^ zobrist_piece_keys[rook][move.end_row][rook_end_col]
+        key ^= zobrist_castle_keys[self.castle_rights_log[-2].get_index()] ^ zobrist_castle_keys[self.current_castling_rights.get_index()]
+        key ^= prev_en_passant_key ^ self.get_en_passant_key(self.en_passant_possible_sq)
+        self.zobrist_key = key
+        self.zobrist_key_log.append(key)
+
+        #update the three rep rule, positions before a pawn move or capture can never occur again
+        if self.pawn_and_cap_move_counter[-1] == 0:
+            self.rep_counter_log.append(self.rep_counter)
+            self.rep_counter = {}
+        self.rep_counter[key] = self.rep_counter.get(key, 0) + 1
 
     # undo the last move
     def undo_move(self):
@@ -174,14 +230,68 @@ class GamePosition():
                     self.position[move.end_row][move.end_col - 2] = self.position[move.end_row][move.end_col + 1]
                     self.position[move.end_row][move.end_col + 1] = '--'
 
+            # undo the scores
+            if self.score_log is not None:
+                self.score_log.pop()
+                self.material_score, self.positional_score = self.score_log[-1]
+
+            # undo the zobrist key and the three rep counter
+            if self.rep_counter[self.zobrist_key] == 1:
+                del self.rep_counter[self.zobrist_key]
+            else:
+                self.rep_counter[self.zobrist_key] -= 1
+            if self.pawn_and_cap_move_counter[-1] == 0:
+                self.rep_counter = self.rep_counter_log.pop()
+            self.zobrist_key_log.pop()
+            self.zobrist_key = self.zobrist_key_log[-1]
+
             self.pawn_and_cap_move_counter.pop()
-            self.position_history.pop()
 
             self.checkmate = False
             self.stalemate = False
             self.fifty_moves_draw = False
             self.three_rep_draw = False
 
+    @classmethod
+    def set_score_tables(cls, material_values, positional_values):
+        cls.material_values = material_values
+        cls.positional_values = positional_values
+
+    # calculate the material and positional scores from scratch
+    def get_full_scores(self):
+        material_score = 0
+        positional_score = 0
+        if self.material_values is not None:
+            for r in range(8):
+                for c in range(8):
+                    piece = self.position[r][c]
+                    if piece != '--':
+                        material_score += self.material_values[piece]
+                        positional_score += self.positional_values[piece][r][c]
+        return material_score, positional_score
+
+    # the scores are tracked if the tables are installed when the game starts, score_log is None otherwise
+    def init_scores(self):
+        self.material_score, self.positional_score = self.get_full_scores()
+        self.score_log = [(self.material_score, self.positional_score)] if self.material_values is not None else None
+
+    # update the scores by the squares changed by a move that was just made
+    def update_scores(self, move):
+        material_values = self.material_values
+        positional_values = self.positional_values
+        piece_placed = self.position[move.end_row][move.end_col]
+        self.material_score += material_values[piece_placed] - material_values[move.piece_move]
+        self.positional_score += positional_values[piece_placed][move.end_row][move.end_col] - positional_values[move.piece_move][move.start_row][move.start_col]
+        if move.is_cap:
+            cap_row = move.start_row if move.is_en_passant else move.end_row
+            self.material_score -= material_values[move.piece_caped]
+            self.positional_score -= positional_values[move.piece_caped][cap_row][move.end_col]
+        if move.is_castle:
+            rook = move.piece_move[0] + 'R'
+            rook_start_col, rook_end_col = (7, 5) if move.end_col - move.start_col == 2 else (0, 3)
+            self.positional_score += positional_values[rook][move.end_row][rook_end_col] - positional_values[rook][move.end_row][rook_start_col]
+        self.score_log.append((self.material_score, self.positional_score))
+
     # update the castle rights by a given move
     def update_castle_rights(self, move):
         # if king or rook moves
@@ -219,6 +329,36 @@ class GamePosition():
 
     # get all legal moves (i.e. considering checks) for current position
     def get_legal_moves(self, expand_promotions=True, return_ids=False):
+        if return_ids:
+            moves = self.generate_legal_move_ids()
+        else:
+            moves = self.generate_legal_moves(expand_promotions)
+
+        #check win and draw
+        if len(moves) == 0:
+            if self.in_check:
+                self.checkmate = True
+            else:
+                self.stalemate = True
+        else:
+            self.checkmate = False
+            self.stalemate = False
+
+        if self.pawn_and_cap_move_counter[-1] >= 50:
+            self.fifty_moves_draw = True
+        if self.rep_counter.get(self.zobrist_key, 0) >= 3:
+            self.three_rep_draw = True
+
+        return moves
+
+    # the ids (see move_to_id) of the legal moves, backends may produce them without building Move objects
+    def generate_legal_move_ids(self):
+        return [move_to_id[(move.start_row, move.start_col, move.end_row, move.end_col, move.promotion_piece[-1])]
+                for move in self.generate_legal_moves()]
+    
+    # generate the legal moves without updating the game over flags
+    # with captures_only, only captures and promotions are generated (the quiet moves are never built)
+    def generate_legal_moves(self, expand_promotions=True, captures_only=False):
         moves = []
         self.in_check, self.checks, self.pins = self.check_pins_and_checks()
         if self.white_turn:
@@ -229,7 +369,7 @@ class GamePosition():
             king_col = self.black_king_location[1]
         if self.in_check:
             if len(self.checks) == 1:
-                moves = self.get_all_moves(expand_all_promotions = expand_promotions)
+                moves = self.get_all_moves(expand_all_promotions = expand_promotions, captures_only = captures_only)
                 check = self.checks[0]
                 check_row = check[0]
                 check_col = check[1]
@@ -246,43 +386,25 @@ class GamePosition():
                 for i in range(len(moves) - 1, -1, -1):
                     if moves[i].piece_move[1] != 'K':
                         if not (moves[i].end_row, moves[i].end_col) in vaild_squares:
-                            moves.remove(moves[i])
-            else:
-                self.get_king_moves(king_row, king_col, moves)
-        else:
-            moves = self.get_all_moves(expand_all_promotions = expand_promotions)
-
-
-        #check win and draw
-        if len(moves) == 0:
-            if self.in_check:
-                self.checkmate = True
+                            # en-passant can also remove a checking pawn
+                            if not (moves[i].is_en_passant and (moves[i].start_row, moves[i].end_col) == (check_row, check_col)):
+                                moves.remove(moves[i])
             else:
-                self.stalemate = True
+                self.get_king_moves(king_row, king_col, moves, captures_only = captures_only)
         else:
-            self.checkmate = False
-            self.stalemate = False
+            moves = self.get_all_moves(expand_all_promotions = expand_promotions, captures_only = captures_only)
+        return moves
 
-        if self.pawn_and_cap_move_counter[-1] >= 50:
-            self.fifty_moves_draw = True
-        same_position_counter = 0
+    # get the legal captures and promotions, sets in_check as well
+    def get_capture_moves(self):
+        return self.generate_legal_moves(captures_only = True)
 
-        for pos in self.position_history:
-            if self.position == pos:
-                same_position_counter += 1
-        if same_position_counter >= 3:
-            self.three_rep_draw = True
+    # whether the side to move is in check, without generating the moves
+    def is_in_check(self):
+        return self.check_pins_and_checks()[0]
 
-        if return_ids:
-            legal_move_ids = []
-            for i in len(moves):
-                legal_move_ids.append(move_to_id[(moves[i].start_row, moves[i].start_col, moves[i].end_row, moves[i].end_col, moves[i].promotion_piece[-1])])
-            return legal_move_ids
-        else:
-            return moves
-    
     # get all possible moves (i.e. without considering checks) for current position
-    def get_all_moves(self, expand_all_promotions = True):
+    def get_all_moves(self, expand_all_promotions = True, captures_only = False):
         moves = []
         for r in range(len(self.position)):
             for c in range(len(self.position[r])):
@@ -290,14 +412,14 @@ class GamePosition():
                 if (color == 'w' and self.white_turn) or (color == 'b' and not self.white_turn):
                     piece = self.position[r][c][1]
                     if piece != 'P':
-                        self.move_functions[piece](r, c, moves)
+                        self.move_functions[piece](r, c, moves, captures_only = captures_only)
                     else:
-                        self.move_functions[piece](r, c, moves, expand_promotions = expand_all_promotions)
+                        self.move_functions[piece](r, c, moves, expand_promotions = expand_all_promotions, captures_only = captures_only)
 
         return moves
 
     # given a pawn, generate all possible moves and attend them to the list moves
-    def get_pawn_moves(self, r, c, moves, expand_promotions = True):
+    def get_pawn_moves(self, r, c, moves, expand_promotions = True, captures_only = False):
         piece_pinned = False
         pin_dir = ()
         for i in range(len(self.pins) - 1, -1, -1):
@@ -320,8 +442,8 @@ class GamePosition():
             promotion_row = 7
             start_row = 1
 
-        if self.position[r + front_dir][c] == '--': # advance
-            if not piece_pinned or pin_dir == (front_dir, 0):
+        if self.position[r + front_dir][c] == '--' and (not captures_only or r + front_dir == promotion_row): # advance
+            if not piece_pinned or pin_dir == (front_dir, 0) or pin_dir == (-front_dir, 0):
                 if r + front_dir == promotion_row and expand_promotions:
                     for promotion_piece in ['Q', 'R', 'B', 'N']:
                         moves.append(Move((r, c), (r + front_dir, c), self.position, promotion_piece = ally_color + promotion_piece))
@@ -401,7 +523,7 @@ class GamePosition():
                         moves.append(Move((r, c), (r + 1, c + 1), self.position, is_en_passant = True))
     '''                                
     # given a rook, generate all possible moves and attend them to the list moves
-    def get_rook_moves(self, r, c, moves):
+    def get_rook_moves(self, r, c, moves, captures_only = False):
         piece_pinned = False
         pin_dir = ()
         for i in range(len(self.pins) - 1, -1, -1):
@@ -417,7 +539,8 @@ class GamePosition():
                 for i in range(1,8):
                     if (r + dir[0] * i) >= 0 and (r + dir[0] * i) <= 7 and (c + dir[1] * i) >= 0 and (c + dir[1] * i) <= 7:
                         if self.position[r + dir[0] * i][c + dir[1] * i] == '--':
-                            moves.append(Move((r, c), (r + dir[0] * i, c + dir[1] * i), self.position))
+                            if not captures_only:
+                                moves.append(Move((r, c), (r + dir[0] * i, c + dir[1] * i), self.position))
                         else:
                             if self.position[r + dir[0] * i][c + dir[1] * i][0] == 'b' and self.white_turn:
                                 moves.append(Move((r, c), (r + dir[0] * i, c + dir[1] * i), self.position))
@@ -428,7 +551,7 @@ class GamePosition():
                         break
 
     # given a knight, generate all possible moves and attend them to the list moves
-    def get_knight_moves(self, r, c, moves):
+    def get_knight_moves(self, r, c, moves, captures_only = False):
         piece_pinned = False
         for i in range(len(self.pins) - 1, -1, -1):
             if self.pins[i][0] == r and self.pins[i][1] == c:
@@ -437,14 +560,14 @@ class GamePosition():
                 break
         if not piece_pinned:    
             for i, j in [(1,2), (1,-2), (-1,2), (-1,-2), (2,1), (2,-1), (-2,1), (-2,-1)]:
-                if (r + i) >= 0 and (r + i) <= 7 and (c + j) >= 0 and (c + j) <= 7:
+                if (r + i) >= 0 and (r + i) <= 7 and (c + j) >= 0 and (c + j) <= 7 and (not captures_only or self.position[r+i][c+j] != '--'):
                     if self.position[r+i][c+j][0] != 'w' and self.white_turn:
                         moves.append(Move((r, c), (r+i, c+j), self.position))
                     if self.position[r+i][c+j][0] != 'b' and (not self.white_turn):
                         moves.append(Move((r, c), (r+i, c+j), self.position))
 
     # given a bishop, generate all possible moves and attend them to the list moves
-    def get_bishop_moves(self, r, c, moves):
+    def get_bishop_moves(self, r, c, moves, captures_only = False):
         piece_pinned = False
         pin_dir = ()
         for i in range(len(self.pins) - 1, -1, -1):
@@ -459,7 +582,8 @@ class GamePosition():
                 for i in range(1,8):
                     if (r + dir[0] * i) >= 0 and (r + dir[0] * i) <= 7 and (c + dir[1] * i) >= 0 and (c + dir[1] * i) <= 7:
                         if self.position[r + dir[0] * i][c + dir[1] * i] == '--':
-                            moves.append(Move((r, c), (r + dir[0] * i, c + dir[1] * i), self.position))
+                            if not captures_only:
+                                moves.append(Move((r, c), (r + dir[0] * i, c + dir[1] * i), self.position))
                         else:
                             if self.position[r + dir[0] * i][c + dir[1] * i][0] == 'b' and self.white_turn:
                                 moves.append(Move((r, c), (r + dir[0] * i, c + dir[1] * i), self.position))
@@ -470,18 +594,18 @@ class GamePosition():
                         break
 
     # given a queen, generate all possible moves and attend them to the list moves
-    def get_queen_moves(self, r, c, moves):
-        self.get_rook_moves(r, c, moves)
-        self.get_bishop_moves(r, c, moves) 
+    def get_queen_moves(self, r, c, moves, captures_only = False):
+        self.get_rook_moves(r, c, moves, captures_only)
+        self.get_bishop_moves(r, c, moves, captures_only)
 
     # given a king, generate all possible moves and attend them to the list moves
-    def get_king_moves(self, r, c, moves):
+    def get_king_moves(self, r, c, moves, captures_only = False):
         ally_color = 'w' if self.white_turn else 'b'
         for i in [-1, 0, 1]:
             for j in [-1, 0, 1]:
                 if i != 0 or j != 0:
                     if (r + i) >= 0 and (r + i) <= 7 and (c + j) >= 0 and (c + j) <= 7:
-                        if self.position[r+i][c+j][0] != ally_color:
+                        if self.position[r+i][c+j][0] != ally_color and (not captures_only or self.position[r+i][c+j] != '--'):
                             if ally_color == 'w':
                                 self.white_king_location = (r+i, c+j)
                             else:
@@ -493,7 +617,8 @@ class GamePosition():
                                 self.white_king_location = (r, c)
                             else:
                                 self.black_king_location = (r, c)
-        self.get_castle_moves(r, c, moves, ally_color)
+        if not captures_only:
+            self.get_castle_moves(r, c, moves, ally_color)
 
     def get_castle_moves(self, r, c, moves, ally_color):
         if self.in_check:
@@ -584,6 +709,146 @@ class GamePosition():
             self.black_king_location = store_king_location
         return is_under_attack
     
+    # the en-passant file only counts if an enemy pawn stands next to the pawn that just advanced two squares
+    def get_en_passant_key(self, en_passant_sq):
+        if en_passant_sq == ():
+            return 0
+        r, c = en_passant_sq
+        pawn_row, enemy_pawn = (4, 'bP') if r == 5 else (3, 'wP')
+        if (c > 0 and self.position[pawn_row][c-1] == enemy_pawn) or (c < 7 and self.position[pawn_row][c+1] == enemy_pawn):
+            return zobrist_en_passant_keys[c]
+        return 0
+
+    # calculate the zobrist key of the current position from scratch
+    def get_zobrist_key(self):
+        key = 0 if self.white_turn else zobrist_black_turn_key
+        for r in range(8):
+            for c in range(8):
+                if self.position[r][c] != '--':
+                    key ^= zobrist_piece_keys[self.position[r][c]][r][c]
+        key ^= zobrist_castle_keys[self.current_castling_rights.get_index()]
+        key ^= self.get_en_passant_key(self.en_passant_possible_sq)
+        return key
+
+    # build a game position from a fen string
+    @classmethod
+    def from_fen(cls, fen):
+        gp = cls()
+        gp.set_fen(fen)
+        return gp
+
+    # replace the current game by the position described by a fen string, the history is cleared
+    def set_fen(self, fen):
+        # the whole fen is checked before the game is changed, a malformed fen raises a ValueError
+        def invalid(reason):
+            return ValueError('invalid fen ({}): {}'.format(reason, fen))
+        fields = fen.split()
+        if len(fields) < 4 or len(fields) > 6:
+            raise invalid('expected 4 to 6 fields, got {}'.format(len(fields)))
+        placement, turn, castling, en_passant = fields[:4]
+        counters = fields[4:]
+        if not all(counter.isdigit() for counter in counters):
+            raise invalid('the move counters must be non negative integers')
+        half_moves = int(counters[0]) if len(counters) > 0 else 0
+        full_moves = int(counters[1]) if len(counters) > 1 else 1
+        if full_moves < 1:
+            raise invalid('the full move number starts at 1')
+        rows = placement.split('/')
+        if len(rows) != 8:
+            raise invalid('expected 8 ranks, got {}'.format(len(rows)))
+        position = [['--'] * 8 for r in range(8)]
+        king_locations = {'K': [], 'k': []}
+        for r in range(8):
+            c = 0
+            for char in rows[r]:
+                if char in '12345678':
+                    c += int(char)
+                elif char.upper() in self.move_functions:
+                    if c > 7:
+                        raise invalid('rank {} is longer than 8 squares'.format(8 - r))
+                    position[r][c] = ('w' if char.isupper() else 'b') + char.upper()
+                    if char in king_locations:
+                        king_locations[char].append((r, c))
+                    c += 1
+                else:
+                    raise invalid('unknown piece {!r}'.format(char))
+            if c != 8:
+                raise invalid('rank {} has {} squares instead of 8'.format(8 - r, c))
+        if len(king_locations['K']) != 1 or len(king_locations['k']) != 1:
+            raise invalid('each side must have exactly one king')
+        if any(position[r][c][1] == 'P' for r in [0, 7] for c in range(8)):
+            raise invalid('a pawn cannot stand on the first or the last rank')
+        if turn not in ['w', 'b']:
+            raise invalid('the side to move must be w or b, got {!r}'.format(turn))
+        if castling != '-' and (any(char not in 'KQkq' for char in castling) or len(set(castling)) != len(castling)):
+            raise invalid('the castling field must be - or a subset of KQkq, got {!r}'.format(castling))
+        if en_passant != '-' and (len(en_passant) != 2 or en_passant[0] not in Move.files_to_cols or
+                                  en_passant[1] != ('6' if turn == 'w' else '3')):
+            raise invalid('the en passant square must be - or a square of rank {}, got {!r}'.format('6' if turn == 'w' else '3', en_passant))
+        if en_passant != '-':
+            # the pawn that just moved two squares stands in front of the en passant square, the squares it passed are empty
+            ep_row, ep_col = Move.ranks_to_rows[en_passant[1]], Move.files_to_cols[en_passant[0]]
+            pawn_step = 1 if turn == 'w' else -1
+            if position[ep_row + pawn_step][ep_col] != ('b' if turn == 'w' else 'w') + 'P' or \
+               position[ep_row][ep_col] != '--' or position[ep_row - pawn_step][ep_col] != '--':
+                raise invalid('no pawn has just moved two squares through the en passant square {}'.format(en_passant))
+
+        self.position = position
+        self.white_king_location = king_locations['K'][0]
+        self.black_king_location = king_locations['k'][0]
+        self.white_turn = turn == 'w'
+        self.checkmate = False
+        self.stalemate = False
+        self.move_history = []
+        self.in_check = False
+        self.pins = []
+        self.checks = []
+        if en_passant == '-':
+            self.en_passant_possible_sq = ()
+        else:
+            self.en_passant_possible_sq = (Move.ranks_to_rows[en_passant[1]], Move.files_to_cols[en_passant[0]])
+        self.en_passant_possible_log = [self.en_passant_possible_sq]
+        self.current_castling_rights = CastleRights('K' in castling, 'k' in castling, 'Q' in castling, 'q' in castling)
+        self.castle_rights_log = [CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
+                                               self.current_castling_rights.wqs, self.current_castling_rights.bqs)]
+        self.pawn_and_cap_move_counter = [half_moves]
+        self.fifty_moves_draw = False
+        self.three_rep_draw = False
+        self.zobrist_key = self.get_zobrist_key()
+        self.zobrist_key_log = [self.zobrist_key]
+        self.rep_counter = {self.zobrist_key: 1}
+        self.rep_counter_log = []
+        self.ply_offset = 2 * (full_moves - 1) + (0 if self.white_turn else 1)
+        self.init_scores()
+
+    # export the current position as a fen string
+    def to_fen(self):
+        rows = []
+        for r in range(8):
+            row = ''
+            empty = 0
+            for c in range(8):
+                piece = self.position[r][c]
+                if piece == '--':
+                    empty += 1
+                else:
+                    if empty > 0:
+                        row += str(empty)
+                        empty = 0
+                    row += piece[1] if piece[0] == 'w' else piece[1].lower()
+            if empty > 0:
+                row += str(empty)
+            rows.append(row)
+        castling = ('K' if self.current_castling_rights.wks else '') + ('Q' if self.current_castling_rights.wqs else '') + \
+                   ('k' if self.current_castling_rights.bks else '') + ('q' if self.current_castling_rights.bqs else '')
+        if self.en_passant_possible_sq == ():
+            en_passant = '-'
+        else:
+            en_passant = Move.cols_to_files[self.en_passant_possible_sq[1]] + Move.rows_to_ranks[self.en_passant_possible_sq[0]]
+        full_moves = (self.ply_offset + len(self.move_history)) // 2 + 1
+        return ' '.join(['/'.join(rows), 'w' if self.white_turn else 'b', castling or '-', en_passant,
+                         str(self.pawn_and_cap_move_counter[-1]), str(full_moves)])
+
     def get_array(self):
         cur_array = np.zeros([9, 8, 8])
         for r in range(8): #the first 0:6-th matrices represent the location of pieces
@@ -612,7 +877,7 @@ class GamePosition():
         return cur_array
     
     def make_move_by_id(self, move_id):
-        start_row, start_col, end_row, end_col, promotionPiece = id_to_move(move_id)
+        start_row, start_col, end_row, end_col, promotionPiece = id_to_move[move_id]
         if promotionPiece != '?':
             if end_row == 0:
                 promotionPiece = 'w' + promotionPiece
@@ -621,6 +886,7 @@ class GamePosition():
         isenpassant = (self.position[start_row][start_col][1] == 'P') and ((end_row, end_col) == self.en_passant_possible_sq)
         iscastle = (self.position[start_row][start_col][1] == 'K') and (abs(end_col - start_col) >= 2)
         move = Move((start_row, start_col), (end_row, end_col), self.position, is_en_passant=isenpassant, is_castle=iscastle, promotion_piece=promotionPiece)
+        self.make_move(move)
 
 class CastleRights():
     def __init__(self, wks, bks, wqs, bqs):
@@ -628,6 +894,9 @@ class CastleRights():
         self.bks = bks
         self.wqs = wqs
         self.bqs = bqs
+
+    def get_index(self):
+        return self.wks | (self.bks << 1) | (self.wqs << 2) | (self.bqs << 3)
         
 # moving one piece and saving the related informations
 class Move():
@@ -721,4 +990,21 @@ class Move():
         elif self.is_check:
             move_str += '+'    
         return move_str
-    
+
+# read an epd file line by line, yield each position with its operations (e.g. {'bm': 'Nf3', 'id': '"test 1"'})
+def read_epd(file_path, game_position_class=GamePosition):
+    with open(file_path, 'r') as epd_file:
+        for line in epd_file:
+            line = line.strip()
+            if line == '' or line.startswith('#'):
+                continue
+            fields = line.split(None, 4)
+            operations = {}
+            if len(fields) > 4:
+                for operation in fields[4].split(';'):
+                    operation = operation.strip()
+                    if operation != '':
+                        opcode, _, operand = operation.partition(' ')
+                        operations[opcode] = operand.strip()
+            fen = ' '.join(fields[:4] + [operations.get('hmvc', '0'), operations.get('fmvn', '1')])
+            yield game_position_class.from_fen(fen), operations
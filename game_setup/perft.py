@@ -0,0 +1,93 @@
+import argparse
+import sys
+import time
+from game_setup.chess_rule import GamePosition
+from game_setup.bitboard_rule import BitboardGamePosition
+
+#run from the project root: python -m game_setup.perft [--backend bitboard] [--depth 3] [--position kiwipete] [--divide]
+
+BACKENDS = {'list': GamePosition, 'bitboard': BitboardGamePosition}
+
+#reference positions and their published node counts for depth 1, 2, 3, ...
+PERFT_POSITIONS = {
+    'startpos': ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1', [20, 400, 8902, 197281, 4865609]),
+    'kiwipete': ('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', [48, 2039, 97862, 4085603]),
+    'position3': ('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', [14, 191, 2812, 43238, 674624]),
+    'position4': ('r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', [6, 264, 9467, 422333]),
+    'position4_mirrored': ('r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1', [6, 264, 9467, 422333]),
+    'position5': ('rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', [44, 1486, 62379, 2103487]),
+    'position6': ('r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10', [46, 2079, 89890, 3894594]),
+}
+
+#long algebraic notation of a move, e.g. e2e4 or e7e8q
+def move_to_uci(move):
+    uci = move.get_rank_file(move.start_row, move.start_col) + move.get_rank_file(move.end_row, move.end_col)
+    if move.is_promotion:
+        uci += move.promotion_piece[-1].lower()
+    return uci
+
+#count the leaf nodes of the legal move tree
+def perft(gp, depth):
+    moves = gp.get_legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gp.make_move(move)
+        nodes += perft(gp, depth - 1)
+        gp.undo_move()
+    return nodes
+
+#count the leaf nodes under each root move
+def divide(gp, depth):
+    results = []
+    for move in gp.get_legal_moves():
+        gp.make_move(move)
+        results.append((move_to_uci(move), perft(gp, depth - 1) if depth > 1 else 1))
+        gp.undo_move()
+    return results
+
+#run perft on one position, report nodes, nodes per second and whether the count matches the published one
+def run_position(name, backend='bitboard', depth=3, show_divide=False):
+    fen, expected_counts = PERFT_POSITIONS[name]
+    gp = BACKENDS[backend].from_fen(fen)
+    start_time = time.perf_counter()
+    if show_divide:
+        results = divide(gp, depth)
+        nodes = sum(count for uci, count in results)
+    else:
+        nodes = perft(gp, depth)
+    elapsed = time.perf_counter() - start_time
+    expected = expected_counts[depth - 1] if depth <= len(expected_counts) else None
+    passed = expected is None or nodes == expected
+    if show_divide:
+        for uci, count in sorted(results):
+            print('  {}: {}'.format(uci, count))
+    print('{:<20} depth {}  nodes {:>9}  expected {:>9}  {:>10.0f} nodes/s  {}'.format(
+        name, depth, nodes, expected if expected is not None else '?', nodes / elapsed if elapsed > 0 else 0,
+        'ok' if passed else 'FAILED'))
+    return passed, nodes, elapsed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='perft benchmark and correctness check of the move generator')
+    parser.add_argument('--backend', choices=list(BACKENDS), default='bitboard')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--position', choices=list(PERFT_POSITIONS), action='append',
+                        help='position to run, can be given several times (default: all)')
+    parser.add_argument('--divide', action='store_true', help='print the node count under each root move')
+    args = parser.parse_args(argv)
+
+    all_passed = True
+    total_nodes = 0
+    total_time = 0
+    for name in (args.position or list(PERFT_POSITIONS)):
+        passed, nodes, elapsed = run_position(name, args.backend, args.depth, args.divide)
+        all_passed = all_passed and passed
+        total_nodes += nodes
+        total_time += elapsed
+    print('total nodes {}  {:.2f} s  {:.0f} nodes/s  backend {}'.format(
+        total_nodes, total_time, total_nodes / total_time if total_time > 0 else 0, args.backend))
+    return 0 if all_passed else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -22,7 +22,7 @@ def one_move_thinker_find(gp ,legal_moves):
         opponent_score = np.empty(opponent_move_number)
         for j in range(opponent_move_number):
             gp.make_move(opponent_moves[j])
-            opponent_score[j] = ai_default_setting.cal_material_score(gp.position)
+            opponent_score[j] = ai_default_setting.get_material_score(gp)
             gp.undo_move()
         '''
         if gp.checkmate:
@@ -0,0 +1,8 @@
+import os
+import sys
+
+#the game_setup packages are imported from the project root, the mcts scripts import each other by plain name
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in [ROOT, os.path.join(ROOT, 'Monte_Carlo_tree_search')]:
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,41 @@
+import numpy as np
+from bitboard_rule_for_mcts import BitboardGamePosition
+from compact_samples import encode_game, decode_samples, POSITION_BYTES, MAX_POLICY_MOVES
+
+#samples of a short game: the positions met, visit probs over the legal moves, and the winner seen from the player to move
+def get_play_data(n_moves):
+    np.random.seed(0)
+    gp = BitboardGamePosition()
+    play_data = []
+    for i in range(n_moves):
+        legal_moves_id_list = gp.get_legal_moves(return_ids=True)
+        probs = np.zeros(1968)
+        probs[legal_moves_id_list] = np.random.dirichlet(np.ones(len(legal_moves_id_list)))
+        play_data.append((gp.get_array(), probs, 1 if gp.white_turn else -1))
+        gp.make_move_by_id(np.random.choice(legal_moves_id_list))
+    return play_data
+
+def test_encode_decode_round_trip():
+    play_data = get_play_data(12)
+    samples = encode_game(play_data)
+    assert samples['position_bits'].shape == (12, POSITION_BYTES)
+    assert samples['move_ids'].shape == samples['move_probs'].shape == (12, MAX_POLICY_MOVES)
+    positions, probs, winners = decode_samples(samples)
+    assert positions.dtype == probs.dtype == winners.dtype == np.float32
+    for i, (position, move_probs, winner) in enumerate(play_data):
+        np.testing.assert_array_equal(positions[i], position)
+        #the same moves keep a prob, within the float16 rounding
+        np.testing.assert_array_equal(probs[i] > 0, move_probs > 0)
+        np.testing.assert_allclose(probs[i], move_probs, atol=1e-3)
+        assert abs(probs[i].sum() - 1) < 1e-5
+        assert winners[i] == winner
+
+def test_decode_a_subset_of_rows():
+    play_data = get_play_data(6)
+    samples = encode_game(play_data)
+    rows = np.array([4, 1])
+    positions, probs, winners = decode_samples({field: array[rows] for field, array in samples.items()})
+    for i, row in enumerate(rows):
+        np.testing.assert_array_equal(positions[i], play_data[row][0])
+        np.testing.assert_allclose(probs[i], play_data[row][1], atol=1e-3)
+        assert winners[i] == play_data[row][2]
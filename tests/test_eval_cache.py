@@ -0,0 +1,41 @@
+from eval_cache import EvalCache, ENTRY_OVERHEAD_BYTES
+from net import PolicyValueNet
+
+#the entries of the tests hold two moves, an int16 and a float16 array of 2 items each
+ENTRY_BYTES = ENTRY_OVERHEAD_BYTES + 2 * 2 + 2 * 2
+
+def put(cache, key):
+    return cache.put(key, [(1, 0.5), (2, 0.5)], 0.25)
+
+def test_least_recently_used_entry_is_evicted():
+    cache = EvalCache(3 * ENTRY_BYTES / (1024 * 1024))
+    for key in range(3):
+        put(cache, key)
+    assert len(cache) == 3
+    #reading 0 makes 1 the least recently used entry
+    assert cache.get(0) is not None
+    put(cache, 3)
+    assert len(cache) == 3
+    assert cache.get(1) is None
+    for key in [0, 2, 3]:
+        action_probs, value = cache.get(key)
+        assert list(action_probs) == [(1, 0.5), (2, 0.5)]
+        assert value == 0.25
+    assert cache.n_bytes == 3 * ENTRY_BYTES
+    #a key put again replaces its entry instead of adding one
+    put(cache, 3)
+    assert len(cache) == 3
+    assert cache.n_bytes == 3 * ENTRY_BYTES
+
+def test_cache_is_cleared_by_load_model(tmp_path):
+    model_file = str(tmp_path / 'model.pkl')
+    policy_value_net = PolicyValueNet()
+    policy_value_net.save_model(model_file)
+    put(policy_value_net.eval_cache, 0)
+    generation = policy_value_net.eval_cache.generation
+    policy_value_net.load_model(model_file)
+    assert len(policy_value_net.eval_cache) == 0
+    assert policy_value_net.eval_cache.n_bytes == 0
+    assert policy_value_net.eval_cache.get(0) is None
+    #the searches sharing the cache see that it was cleared
+    assert policy_value_net.eval_cache.generation == generation + 1
@@ -0,0 +1,69 @@
+import pytest
+from game_setup.chess_rule import read_epd
+from game_setup.perft import BACKENDS
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+@pytest.mark.parametrize('fen', [
+    '',
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq',    #missing field
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1 extra',
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w KQkq - 0 1',    #7 ranks
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNX w KQkq - 0 1',    #unknown piece
+    'rnbqkbnr/ppppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',    #rank of 9 squares
+    'rnbqkbnr/pppppppp/7/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',    #rank of 7 squares
+    'rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+    'rnbq1bnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQ - 0 1',    #no black king
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1',    #side to move
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkx - 0 1',    #castling field
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KKkq - 0 1',
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e9 0 1',    #en passant field
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq i6 0 1',
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e3 0 1',    #en passant square behind the wrong side
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e6 0 1',    #no pawn moved two squares through e6
+    'rnbqkbnr/pppp1ppp/8/4P3/8/8/PPPP1PPP/RNBQKBNR w KQkq e6 0 1',    #the pawn in front of e6 is white
+    'rnbqkbnr/pppp1ppp/4p3/4p3/8/8/PPPP1PPP/RNBQKBNR w KQkq e6 0 1',    #e6 is not empty
+    'rnbqkbnr/pppp1ppp/8/4p3/8/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1',
+    'rnbqkbnP/pppppppp/8/8/8/8/PPPPPPP1/RNBQKBNR w KQkq - 0 1',    #pawn on the last rank
+    'rnbqkbnr/ppppppp1/8/8/8/8/PPPPPPPP/RNBQKBNp w KQkq - 0 1',    #pawn on the first rank
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - x 1',    #move counters
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 0',
+])
+def test_invalid_fen(backend, fen):
+    gp = BACKENDS[backend]()
+    with pytest.raises(ValueError):
+        gp.set_fen(fen)
+    #the game is not changed by a rejected fen
+    assert gp.to_fen() == START_FEN
+    assert len(gp.get_legal_moves()) == 20
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_en_passant_square(backend):
+    #black just played d7d5 next to the white pawn on e5
+    gp = BACKENDS[backend].from_fen('rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3')
+    assert gp.to_fen() == 'rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3'
+    assert any(move.is_en_passant for move in gp.get_legal_moves())
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_read_epd(tmp_path, backend):
+    epd_file = tmp_path / 'positions.epd'
+    epd_file.write_text('#comment line\n'
+                        '\n'
+                        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - id "start"; bm e4;\n'
+                        'rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 hmvc 0; fmvn 3;\n')
+    positions = list(read_epd(str(epd_file), BACKENDS[backend]))
+    assert len(positions) == 2
+    gp, operations = positions[0]
+    assert isinstance(gp, BACKENDS[backend])
+    assert gp.to_fen() == START_FEN
+    assert operations == {'id': '"start"', 'bm': 'e4'}
+    gp, operations = positions[1]
+    assert gp.to_fen() == 'rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3'
+    assert operations == {'hmvc': '0', 'fmvn': '3'}
+
+def test_read_epd_rejects_invalid_position(tmp_path):
+    epd_file = tmp_path / 'positions.epd'
+    epd_file.write_text('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e6 bm e4;\n')
+    with pytest.raises(ValueError):
+        list(read_epd(str(epd_file)))
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+import chess_rule_for_mcts as chess_rule
+from mcts import MonteCarloTreeSearch
+
+#white to move mates in 2, starting with Ra6 (1...bxa6 2.b7#)
+MATE_IN_2_FEN = 'kbK5/pp6/1P6/8/8/8/8/R7 w - - 0 1'
+RA6 = chess_rule.move_to_id[(7, 0, 2, 0, '?')]
+
+def uniform_policy_value_fn(gp):
+    legal_moves_id_list = gp.get_legal_moves(return_ids=True)
+    return zip(legal_moves_id_list, np.ones(len(legal_moves_id_list)) / len(legal_moves_id_list)), 0.0
+
+def uniform_batch_policy_value_fn(position_batch, legal_moves_batch):
+    return [(zip(legal_moves_id_list, np.ones(len(legal_moves_id_list)) / len(legal_moves_id_list)), 0.0)
+            for legal_moves_id_list in legal_moves_batch]
+
+@pytest.mark.parametrize('eval_batch_size', [1, 8])
+@pytest.mark.parametrize('tree_storage', ['dict', 'array', 'dag'])
+def test_mate_in_2_is_proven(tree_storage, eval_batch_size):
+    gp = chess_rule.GamePosition.from_fen(MATE_IN_2_FEN)
+    gp.get_legal_moves()
+    mcts = MonteCarloTreeSearch(uniform_policy_value_fn, 5, 5000, tree_storage, uniform_batch_policy_value_fn,
+                                eval_batch_size=eval_batch_size, search_threads=1, early_stop=True, time_limit=None)
+    n_done = mcts.run_playouts(gp)
+    #the search stops once the root is proven, the side to move wins
+    assert n_done < 5000
+    assert mcts._root.get_proven() == -1
+    assert [act for act, result in mcts._root.get_child_proven() if result == 1] == [RA6]
+    acts, probs = mcts.get_root_move_probs()
+    assert list(acts) == [RA6] and list(probs) == [1.0]
+    #the moves of the playouts are all taken back
+    assert gp.to_fen() == MATE_IN_2_FEN
+    assert len(gp.move_history) == 0
+    assert gp.zobrist_key == gp.get_zobrist_key()
@@ -0,0 +1,24 @@
+import pytest
+from game_setup.perft import BACKENDS, move_to_uci
+from advaced_engines.move_ordering import MoveOrdering
+from advaced_engines.transposition_table import move_to_key
+
+#white can take the queen with the pawn, the rook with the knight or the rook, the pawn with the knight or the queen
+CAPTURES_FEN = '7k/8/4r3/2q2p2/1P1N4/3Q4/8/K3R3 w - - 0 1'
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_captures_in_mvv_lva_order(backend):
+    gp = BACKENDS[backend].from_fen(CAPTURES_FEN)
+    moves = gp.get_legal_moves()
+    MoveOrdering().order_moves(moves, 0)
+    #most valuable victim first, then the least valuable attacker, the quiet moves come after
+    assert [move_to_uci(move) for move in moves[:5]] == ['b4c5', 'd4e6', 'e1e6', 'd4f5', 'd3f5']
+    assert not any(move.is_cap for move in moves[5:])
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_hash_move_before_captures(backend):
+    gp = BACKENDS[backend].from_fen(CAPTURES_FEN)
+    moves = gp.get_legal_moves()
+    quiet_move = next(move for move in moves if move_to_uci(move) == 'a1b1')
+    MoveOrdering().order_moves(moves, 0, hash_move=move_to_key(quiet_move))
+    assert [move_to_uci(move) for move in moves[:3]] == ['a1b1', 'b4c5', 'd4e6']
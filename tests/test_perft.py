@@ -0,0 +1,57 @@
+import random
+import pytest
+from game_setup.perft import BACKENDS, PERFT_POSITIONS, perft
+
+#depth 3 where it stays small, depth 2 for the positions with many moves
+def get_depth(counts):
+    return 3 if counts[2] <= 10000 else 2
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+@pytest.mark.parametrize('name', sorted(PERFT_POSITIONS))
+def test_perft(backend, name):
+    fen, counts = PERFT_POSITIONS[name]
+    gp = BACKENDS[backend]()
+    gp.set_fen(fen)
+    depth = get_depth(counts)
+    assert perft(gp, depth) == counts[depth - 1]
+    assert gp.to_fen() == fen    #every move is undone
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+@pytest.mark.parametrize('name', sorted(PERFT_POSITIONS))
+def test_fen_round_trip(backend, name):
+    fen = PERFT_POSITIONS[name][0]
+    gp = BACKENDS[backend]()
+    gp.set_fen(fen)
+    assert gp.to_fen() == fen
+    #positions reached by random moves, with their castling rights, en passant squares and counters
+    random.seed(name)
+    for i in range(30):
+        moves = gp.get_legal_moves()
+        if len(moves) == 0:
+            break
+        gp.make_move(random.choice(moves))
+        fen = gp.to_fen()
+        copy = BACKENDS[backend]()
+        copy.set_fen(fen)
+        assert copy.to_fen() == fen
+        assert sorted(copy.get_legal_moves(return_ids=True)) == sorted(gp.get_legal_moves(return_ids=True))
+
+#the captures only generation gives the captures and promotions of the full generation
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+@pytest.mark.parametrize('name', sorted(PERFT_POSITIONS))
+def test_capture_moves(backend, name):
+    def get_key(move):
+        return (move.start_row, move.start_col, move.end_row, move.end_col, move.promotion_piece)
+    gp = BACKENDS[backend]()
+    gp.set_fen(PERFT_POSITIONS[name][0])
+    random.seed(name)
+    for i in range(40):
+        moves = gp.get_legal_moves()
+        if len(moves) == 0:
+            break
+        in_check = gp.in_check
+        assert gp.is_in_check() == in_check
+        assert sorted(get_key(move) for move in gp.get_capture_moves()) == \
+               sorted(get_key(move) for move in moves if move.is_cap or move.is_promotion)
+        assert gp.in_check == in_check
+        gp.make_move(random.choice(moves))
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+from replay_buffer import ReplayBuffer
+from compact_samples import encode_game
+
+def random_game(n_moves):
+    return encode_game([(np.random.randint(-1, 2, (9, 8, 8)), np.random.dirichlet(np.ones(1968)), 1)
+                        for i in range(n_moves)])
+
+def test_second_writer_fails_fast(tmp_path):
+    writer = ReplayBuffer(str(tmp_path), buffer_size=20, shard_size=10, writer=True)
+    writer.add_game(random_game(5))
+    with pytest.raises(RuntimeError):
+        ReplayBuffer(str(tmp_path), buffer_size=20, shard_size=10, writer=True)
+    #a reader does not take the lock but cannot write
+    reader = ReplayBuffer(str(tmp_path), buffer_size=20, shard_size=10)
+    with pytest.raises(RuntimeError):
+        reader.add_game(random_game(5))
+    assert len(reader) == 5
+    #the lock is free again once the writer is closed
+    writer.close()
+    writer = ReplayBuffer(str(tmp_path), buffer_size=20, shard_size=10, writer=True)
+    writer.add_game(random_game(5))
+    writer.close()
+    assert len(reader) == 5
+    reader.reload()
+    assert len(reader) == 10
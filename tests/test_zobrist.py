@@ -0,0 +1,40 @@
+import random
+import pytest
+from game_setup.perft import BACKENDS, PERFT_POSITIONS
+
+#the incremental key of make_move and undo_move must equal the key computed from the whole position
+def check_keys(gp, depth):
+    key = gp.zobrist_key
+    assert key == gp.get_zobrist_key()
+    if depth == 0:
+        return
+    for move in gp.get_legal_moves():
+        gp.make_move(move)
+        check_keys(gp, depth - 1)
+        gp.undo_move()
+        assert gp.zobrist_key == key
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+@pytest.mark.parametrize('name', sorted(PERFT_POSITIONS))
+def test_zobrist_key_after_make_and_undo(backend, name):
+    gp = BACKENDS[backend].from_fen(PERFT_POSITIONS[name][0])
+    check_keys(gp, 2)
+
+#random games reach en passant captures, promotions and lost castling rights deeper than the walk above
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+@pytest.mark.parametrize('name', sorted(PERFT_POSITIONS))
+def test_zobrist_key_in_random_games(backend, name):
+    gp = BACKENDS[backend].from_fen(PERFT_POSITIONS[name][0])
+    random.seed(name)
+    keys = [gp.zobrist_key]
+    for i in range(60):
+        moves = gp.get_legal_moves()
+        if len(moves) == 0:
+            break
+        gp.make_move(random.choice(moves))
+        assert gp.zobrist_key == gp.get_zobrist_key()
+        keys.append(gp.zobrist_key)
+    while len(gp.move_history) > 0:
+        gp.undo_move()
+        keys.pop()
+        assert gp.zobrist_key == keys[-1] == gp.get_zobrist_key()